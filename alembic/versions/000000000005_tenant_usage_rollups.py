@@ -0,0 +1,51 @@
+"""tenant_usage_rollups (uso por tenant, downsampling hora/día)"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as psql
+
+# Revision identifiers
+revision = "000000000005"
+down_revision = "000000000004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Una fila por (tenant, granularidad, bucket). El collector hace UPSERT sobre
+    # los buckets 'hour' y 'day' en cada muestra: no hay tabla de muestras crudas.
+    op.create_table(
+        "tenant_usage_rollups",
+        sa.Column("tenant_id", psql.UUID(as_uuid=False), nullable=False),
+        sa.Column("granularity", sa.Text, nullable=False),
+        sa.Column("bucket_start", psql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("samples", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("db_size_bytes", sa.BigInteger, nullable=True),
+        sa.Column("users_count", sa.BigInteger, nullable=True),
+        sa.Column("attachments_bytes", sa.BigInteger, nullable=True),
+        sa.Column("last_sampled_at", psql.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("tenant_id", "granularity", "bucket_start", name="pk_tenant_usage_rollups"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["control_plane.tenants.id"],
+            ondelete="CASCADE",
+            deferrable=True,
+            initially="DEFERRED",
+            name="fk_usage_tenant",
+        ),
+        sa.CheckConstraint("granularity IN ('hour','day')", name="usage_granularity_chk"),
+        schema="control_plane",
+    )
+    # Purga de retención por granularidad/antigüedad
+    op.create_index(
+        "idx_usage_granularity_bucket",
+        "tenant_usage_rollups",
+        ["granularity", "bucket_start"],
+        unique=False,
+        schema="control_plane",
+    )
+
+
+def downgrade():
+    op.drop_index("idx_usage_granularity_bucket", table_name="tenant_usage_rollups", schema="control_plane")
+    op.drop_table("tenant_usage_rollups", schema="control_plane")
@@ -0,0 +1,44 @@
+"""tenant_limits: límites de admisión (concurrencia y rate limit por tenant)"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = "000000000006"
+down_revision = "000000000005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL => se usa el default del billing_plan (o el global)
+    op.add_column("tenant_limits", sa.Column("max_concurrent_requests", sa.Integer, nullable=True), schema="control_plane")
+    op.add_column("tenant_limits", sa.Column("rate_limit_per_s", sa.Integer, nullable=True), schema="control_plane")
+    op.add_column("tenant_limits", sa.Column("rate_limit_burst", sa.Integer, nullable=True), schema="control_plane")
+    op.create_check_constraint(
+        "limits_concurrency_pos",
+        "tenant_limits",
+        "max_concurrent_requests IS NULL OR max_concurrent_requests > 0",
+        schema="control_plane",
+    )
+    op.create_check_constraint(
+        "limits_rate_pos",
+        "tenant_limits",
+        "rate_limit_per_s IS NULL OR rate_limit_per_s > 0",
+        schema="control_plane",
+    )
+    op.create_check_constraint(
+        "limits_burst_pos",
+        "tenant_limits",
+        "rate_limit_burst IS NULL OR rate_limit_burst > 0",
+        schema="control_plane",
+    )
+
+
+def downgrade():
+    op.drop_constraint("limits_burst_pos", "tenant_limits", schema="control_plane")
+    op.drop_constraint("limits_rate_pos", "tenant_limits", schema="control_plane")
+    op.drop_constraint("limits_concurrency_pos", "tenant_limits", schema="control_plane")
+    op.drop_column("tenant_limits", "rate_limit_burst", schema="control_plane")
+    op.drop_column("tenant_limits", "rate_limit_per_s", schema="control_plane")
+    op.drop_column("tenant_limits", "max_concurrent_requests", schema="control_plane")
@@ -0,0 +1,113 @@
+"""tenant_jobs: cola durable de operaciones largas (SKIP LOCKED)"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as psql
+
+# Revision identifiers
+revision = "000000000007"
+down_revision = "000000000006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tenant_jobs",
+        sa.Column("id", psql.UUID(as_uuid=False), primary_key=True, server_default=sa.text("gen_random_uuid()")),
+        sa.Column("tenant_id", psql.UUID(as_uuid=False), nullable=False),
+        sa.Column("kind", sa.Text, nullable=False),
+        sa.Column("status", sa.Text, nullable=False, server_default=sa.text("'queued'")),
+        # Denormalizado desde tenants para el tope de concurrencia por host
+        sa.Column("db_host", sa.Text, nullable=False),
+        sa.Column("payload", psql.JSONB, nullable=True),
+        sa.Column("progress", sa.SmallInteger, nullable=False, server_default=sa.text("0")),
+        sa.Column("progress_message", sa.Text, nullable=True),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("max_attempts", sa.Integer, nullable=False, server_default=sa.text("5")),
+        sa.Column("run_after", psql.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("locked_by", sa.Text, nullable=True),
+        sa.Column("locked_at", psql.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", psql.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text, nullable=True),
+        sa.Column("created_at", psql.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("updated_at", psql.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("finished_at", psql.TIMESTAMP(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["control_plane.tenants.id"],
+            ondelete="CASCADE",
+            deferrable=True,
+            initially="DEFERRED",
+            name="fk_jobs_tenant",
+        ),
+        sa.CheckConstraint("kind IN ('provision','finalize_delete','migrate')", name="jobs_kind_chk"),
+        sa.CheckConstraint("status IN ('queued','running','succeeded','failed')", name="jobs_status_chk"),
+        sa.CheckConstraint("progress BETWEEN 0 AND 100", name="jobs_progress_range_chk"),
+        sa.CheckConstraint("max_attempts > 0", name="jobs_max_attempts_pos"),
+        schema="control_plane",
+    )
+
+    # Claim: sólo filas encoladas, en orden de ejecución
+    op.create_index(
+        "idx_tenant_jobs_claim",
+        "tenant_jobs",
+        ["run_after", "created_at"],
+        unique=False,
+        schema="control_plane",
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    # Tope por db_host y reaper de leases vencidos
+    op.create_index(
+        "idx_tenant_jobs_running_host",
+        "tenant_jobs",
+        ["db_host"],
+        unique=False,
+        schema="control_plane",
+        postgresql_where=sa.text("status = 'running'"),
+    )
+    # Serialización por tenant: a lo sumo un job corriendo por tenant
+    op.create_index(
+        "uq_tenant_jobs_running_tenant",
+        "tenant_jobs",
+        ["tenant_id"],
+        unique=True,
+        schema="control_plane",
+        postgresql_where=sa.text("status = 'running'"),
+    )
+    # Un mismo tipo de job no se encola dos veces mientras esté pendiente
+    op.create_index(
+        "uq_tenant_jobs_active_kind",
+        "tenant_jobs",
+        ["tenant_id", "kind"],
+        unique=True,
+        schema="control_plane",
+        postgresql_where=sa.text("status IN ('queued','running')"),
+    )
+    op.create_index(
+        "idx_tenant_jobs_tenant_created",
+        "tenant_jobs",
+        ["tenant_id", "created_at"],
+        unique=False,
+        schema="control_plane",
+    )
+
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_jobs_set_updated ON control_plane.tenant_jobs;
+        CREATE TRIGGER trg_jobs_set_updated
+        BEFORE UPDATE ON control_plane.tenant_jobs
+        FOR EACH ROW
+        EXECUTE FUNCTION control_plane.set_updated_at();
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_jobs_set_updated ON control_plane.tenant_jobs")
+    op.drop_index("idx_tenant_jobs_tenant_created", table_name="tenant_jobs", schema="control_plane")
+    op.drop_index("uq_tenant_jobs_active_kind", table_name="tenant_jobs", schema="control_plane")
+    op.drop_index("uq_tenant_jobs_running_tenant", table_name="tenant_jobs", schema="control_plane")
+    op.drop_index("idx_tenant_jobs_running_host", table_name="tenant_jobs", schema="control_plane")
+    op.drop_index("idx_tenant_jobs_claim", table_name="tenant_jobs", schema="control_plane")
+    op.drop_table("tenant_jobs", schema="control_plane")
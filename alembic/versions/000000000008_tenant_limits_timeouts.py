@@ -0,0 +1,35 @@
+"""tenant_limits: timeouts de sesión para conexiones a la BD del tenant"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = "000000000008"
+down_revision = "000000000007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL => se usa el default del billing_plan (o el global)
+    op.add_column("tenant_limits", sa.Column("statement_timeout_ms", sa.Integer, nullable=True), schema="control_plane")
+    op.add_column("tenant_limits", sa.Column("idle_in_tx_timeout_ms", sa.Integer, nullable=True), schema="control_plane")
+    op.create_check_constraint(
+        "limits_stmt_timeout_pos",
+        "tenant_limits",
+        "statement_timeout_ms IS NULL OR statement_timeout_ms > 0",
+        schema="control_plane",
+    )
+    op.create_check_constraint(
+        "limits_idle_tx_timeout_pos",
+        "tenant_limits",
+        "idle_in_tx_timeout_ms IS NULL OR idle_in_tx_timeout_ms > 0",
+        schema="control_plane",
+    )
+
+
+def downgrade():
+    op.drop_constraint("limits_idle_tx_timeout_pos", "tenant_limits", schema="control_plane")
+    op.drop_constraint("limits_stmt_timeout_pos", "tenant_limits", schema="control_plane")
+    op.drop_column("tenant_limits", "idle_in_tx_timeout_ms", schema="control_plane")
+    op.drop_column("tenant_limits", "statement_timeout_ms", schema="control_plane")
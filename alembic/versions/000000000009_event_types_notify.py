@@ -0,0 +1,40 @@
+"""event_types: NOTIFY en cambios del catálogo (invalida caches en proceso)"""
+
+from alembic import op
+
+# Revision identifiers
+revision = "000000000009"
+down_revision = "000000000008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION control_plane.notify_event_types_changed()
+        RETURNS trigger AS $$
+        BEGIN
+          -- Se entrega al commit; los listeners recargan el catálogo completo
+          PERFORM pg_notify('control_plane_event_types', TG_OP);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_event_types_notify ON control_plane.event_types;
+
+        CREATE TRIGGER trg_event_types_notify
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON control_plane.event_types
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION control_plane.notify_event_types_changed();
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_event_types_notify ON control_plane.event_types;
+        DROP FUNCTION IF EXISTS control_plane.notify_event_types_changed();
+        """
+    )
@@ -0,0 +1,107 @@
+"""tenant_fleet_counters: conteos de tenants por dimensión mantenidos por trigger"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = "000000000010"
+down_revision = "000000000009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Una fila por (dimensión, valor); sólo cuenta tenants sin soft delete.
+    # NULL se guarda como '' (no puede ser parte de la PK).
+    op.create_table(
+        "tenant_fleet_counters",
+        sa.Column("dimension", sa.Text, nullable=False),
+        sa.Column("value", sa.Text, nullable=False),
+        sa.Column("n", sa.BigInteger, nullable=False, server_default=sa.text("0")),
+        sa.PrimaryKeyConstraint("dimension", "value", name="pk_tenant_fleet_counters"),
+        sa.CheckConstraint(
+            "dimension IN ('status','schema_version','app_version','billing_plan','db_host')",
+            name="fleet_dimension_chk",
+        ),
+        schema="control_plane",
+    )
+
+    op.execute(
+        """
+        -- Aplica el delta de OLD (-1) y NEW (+1) sólo en las dimensiones que cambian.
+        -- Filas ordenadas por PK: dos transacciones concurrentes bloquean en el mismo orden.
+        CREATE OR REPLACE FUNCTION control_plane.maintain_fleet_counters()
+        RETURNS trigger AS $$
+        DECLARE
+          dims   text[] := ARRAY['status','schema_version','app_version','billing_plan','db_host'];
+          old_v  text[];
+          new_v  text[];
+          d      text[] := '{}';
+          v      text[] := '{}';
+          delta  int[]  := '{}';
+          i      int;
+        BEGIN
+          IF TG_OP IN ('UPDATE','DELETE') AND OLD.deleted_at IS NULL THEN
+            old_v := ARRAY[OLD.status, OLD.schema_version, coalesce(OLD.app_version, ''),
+                           coalesce(OLD.billing_plan, ''), OLD.db_host];
+          END IF;
+          IF TG_OP IN ('INSERT','UPDATE') AND NEW.deleted_at IS NULL THEN
+            new_v := ARRAY[NEW.status, NEW.schema_version, coalesce(NEW.app_version, ''),
+                           coalesce(NEW.billing_plan, ''), NEW.db_host];
+          END IF;
+
+          FOR i IN 1..array_length(dims, 1) LOOP
+            CONTINUE WHEN old_v[i] IS NOT DISTINCT FROM new_v[i];
+            IF old_v IS NOT NULL THEN
+              d := d || dims[i]; v := v || old_v[i]; delta := delta || -1;
+            END IF;
+            IF new_v IS NOT NULL THEN
+              d := d || dims[i]; v := v || new_v[i]; delta := delta || 1;
+            END IF;
+          END LOOP;
+
+          IF array_length(d, 1) IS NOT NULL THEN
+            INSERT INTO control_plane.tenant_fleet_counters AS c (dimension, value, n)
+            SELECT t.d, t.v, sum(t.delta)
+            FROM unnest(d, v, delta) AS t(d, v, delta)
+            GROUP BY t.d, t.v
+            ORDER BY t.d, t.v
+            ON CONFLICT (dimension, value) DO UPDATE SET n = c.n + EXCLUDED.n;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_tenants_fleet_counters ON control_plane.tenants;
+
+        CREATE TRIGGER trg_tenants_fleet_counters
+        AFTER INSERT OR DELETE OR UPDATE OF status, schema_version, app_version, billing_plan, db_host, deleted_at
+        ON control_plane.tenants
+        FOR EACH ROW
+        EXECUTE FUNCTION control_plane.maintain_fleet_counters();
+
+        -- Carga inicial
+        INSERT INTO control_plane.tenant_fleet_counters (dimension, value, n)
+        SELECT x.dimension, x.value, count(*)
+        FROM control_plane.tenants t,
+        LATERAL (VALUES
+          ('status', t.status),
+          ('schema_version', t.schema_version),
+          ('app_version', coalesce(t.app_version, '')),
+          ('billing_plan', coalesce(t.billing_plan, '')),
+          ('db_host', t.db_host)
+        ) AS x(dimension, value)
+        WHERE t.deleted_at IS NULL
+        GROUP BY x.dimension, x.value;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_tenants_fleet_counters ON control_plane.tenants;
+        DROP FUNCTION IF EXISTS control_plane.maintain_fleet_counters();
+        """
+    )
+    op.drop_table("tenant_fleet_counters", schema="control_plane")
@@ -0,0 +1,32 @@
+"""tenants: status terminal 'deleted' (finalize_delete completado)"""
+
+from alembic import op
+
+# Revision identifiers
+revision = "000000000011"
+down_revision = "000000000010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La fila queda como lápida: tenant_events y tenant_jobs cuelgan de tenants con
+    # ON DELETE CASCADE y un hard delete borraría la auditoría (incluido el evento 'deleted')
+    op.drop_constraint("tenants_status_chk", "tenants", schema="control_plane")
+    op.create_check_constraint(
+        "tenants_status_chk",
+        "tenants",
+        "status IN ('provisioning','active','suspended','deleting','deleted')",
+        schema="control_plane",
+    )
+
+
+def downgrade():
+    op.execute("UPDATE control_plane.tenants SET status = 'deleting' WHERE status = 'deleted'")
+    op.drop_constraint("tenants_status_chk", "tenants", schema="control_plane")
+    op.create_check_constraint(
+        "tenants_status_chk",
+        "tenants",
+        "status IN ('provisioning','active','suspended','deleting')",
+        schema="control_plane",
+    )
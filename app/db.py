@@ -1,26 +1,228 @@
+import asyncio
+import itertools
 import os
-from typing import AsyncGenerator
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, List, Mapping, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
-CONTROL_PLANE_DSN = os.getenv("CONTROL_PLANE_DATABASE_URL")
-if not CONTROL_PLANE_DSN:
-    raise RuntimeError("CONTROL_PLANE_DATABASE_URL no está definida")
-
-engine: AsyncEngine = create_async_engine(
-    CONTROL_PLANE_DSN,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=5,
-    future=True,
-)
-
-SessionLocal = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    autoflush=False,
-    expire_on_commit=False,
-)
+# Réplicas de lectura (opcional): DSNs separados por coma
+REPLICA_DSNS = [d.strip() for d in os.getenv("CONTROL_PLANE_REPLICA_URLS", "").split(",") if d.strip()]
+# Lag máximo por defecto aceptado al leer de réplica (por request: header X-Max-Staleness)
+REPLICA_MAX_LAG_S = float(os.getenv("CONTROL_PLANE_REPLICA_MAX_LAG_S", "5"))
+# Cada cuánto se re-mide lag/salud de una réplica
+REPLICA_CHECK_INTERVAL_S = float(os.getenv("CONTROL_PLANE_REPLICA_CHECK_INTERVAL_S", "2"))
+# Tiempo fuera de rotación tras un fallo
+REPLICA_EJECT_S = float(os.getenv("CONTROL_PLANE_REPLICA_EJECT_S", "30"))
+# Sin mensajes del primario en este lapso el WAL receiver se considera caído
+# (keepalives cada wal_sender_timeout/2, default 30s)
+REPLICA_RECEIVER_STALE_S = float(os.getenv("CONTROL_PLANE_REPLICA_RECEIVER_STALE_S", "60"))
+# El chequeo corre en el request path: una réplica que no responde (black-holed) se
+# expulsa al vencer este tope en vez de esperar el timeout TCP del SO
+REPLICA_PROBE_TIMEOUT_S = float(os.getenv("CONTROL_PLANE_REPLICA_PROBE_TIMEOUT_S", "1"))
+# connect_timeout de libpq para las réplicas (segundos enteros, mínimo efectivo 2)
+REPLICA_CONNECT_TIMEOUT_S = int(os.getenv("CONTROL_PLANE_REPLICA_CONNECT_TIMEOUT_S", "2"))
+
+# Engine, sesiones y router se crean en el primer uso: importar este módulo no
+# conecta, no carga el driver ni exige CONTROL_PLANE_DATABASE_URL (lo valida el lifespan)
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
+_read_router: Optional["ReadReplicaRouter"] = None
+
+
+def control_plane_dsn() -> str:
+    dsn = os.getenv("CONTROL_PLANE_DATABASE_URL")
+    if not dsn:
+        raise RuntimeError("CONTROL_PLANE_DATABASE_URL no está definida")
+    return dsn
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            control_plane_dsn(),
+            pool_pre_ping=True,
+            pool_size=5,
+            max_overflow=5,
+            future=True,
+        )
+    return _engine
+
+
+def new_session(**kw) -> AsyncSession:
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            bind=get_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _session_factory(**kw)
+
+# Lag de replicación en segundos. En un primario (o un destino que no está en
+# recovery, p.ej. una 2da BD local haciendo de réplica) es 0. Si la réplica ya
+# reprodujo todo lo recibido también es 0 (evita lag "creciente" en primarios
+# ociosos), pero sólo si el WAL receiver sigue vivo: una réplica que perdió el
+# upstream está "al día" con lo último que recibió y tendría lag 0 para siempre.
+# (pg_stat_wal_receiver sólo muestra status a roles con pg_read_all_stats; sin
+# ese permiso se usa el lag por timestamp de replay.)
+_LAG_SQL = text("""
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+           AND EXISTS (
+             SELECT 1 FROM pg_stat_wal_receiver
+             WHERE status = 'streaming'
+               AND last_msg_receipt_time > now() - make_interval(secs => :receiver_stale_s)
+           ) THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END AS lag_s
+""")
+
+
+@dataclass
+class _Replica:
+    engine: AsyncEngine
+    lag_s: float = 0.0
+    # -inf: nunca medida (monotonic() cuenta desde el boot, 0.0 no sirve de marca)
+    checked_at: float = float("-inf")
+    ejected_until: float = 0.0
+
+
+class ReadReplicaRouter:
+    """
+    Enruta lecturas a réplicas con round-robin.
+      - Salud: una réplica que falla el chequeo queda fuera de rotación REPLICA_EJECT_S.
+      - Lag: se mide como mucho cada REPLICA_CHECK_INTERVAL_S; se descarta si supera la tolerancia.
+      - Sin réplicas sanas (o tolerancia 0) => primario.
+    """
+
+    def __init__(self, primary: AsyncEngine, replica_dsns: List[str]):
+        self.primary = primary
+        self.replicas = [
+            _Replica(
+                create_async_engine(
+                    dsn,
+                    pool_pre_ping=True,
+                    pool_size=5,
+                    max_overflow=5,
+                    connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT_S},
+                    future=True,
+                )
+            )
+            for dsn in replica_dsns
+        ]
+        self._rr = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._locks = [asyncio.Lock() for _ in self.replicas]
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def eject(self, replica: _Replica) -> None:
+        replica.ejected_until = time.monotonic() + REPLICA_EJECT_S
+
+    def report_failure(self, read_engine: AsyncEngine) -> None:
+        for replica in self.replicas:
+            if replica.engine is read_engine:
+                self.eject(replica)
+
+    def report_error(self, read_engine: AsyncEngine, exc: BaseException) -> None:
+        # Fallo de conexión contra la réplica => fuera de rotación
+        if isinstance(exc, DBAPIError) and (exc.connection_invalidated or isinstance(exc, OperationalError)):
+            self.report_failure(read_engine)
+
+    async def _refresh(self, idx: int) -> bool:
+        """Mide lag/salud de la réplica. False si ya hay una medición en curso (no se espera)."""
+        replica = self.replicas[idx]
+        lock = self._locks[idx]
+        if lock.locked():
+            return False
+        async with lock:
+            if time.monotonic() - replica.checked_at < REPLICA_CHECK_INTERVAL_S:
+                return True  # otro request ya lo midió
+            try:
+                async with asyncio.timeout(REPLICA_PROBE_TIMEOUT_S):
+                    async with replica.engine.connect() as conn:
+                        replica.lag_s = float(
+                            (await conn.execute(_LAG_SQL, {"receiver_stale_s": REPLICA_RECEIVER_STALE_S})).scalar_one()
+                        )
+            except Exception:
+                # Incluye TimeoutError: réplica que no contesta => fuera de rotación
+                self.eject(replica)
+            replica.checked_at = time.monotonic()
+        return True
+
+    async def read_engine(self, max_lag_s: float = REPLICA_MAX_LAG_S) -> AsyncEngine:
+        if not self.replicas or max_lag_s <= 0:
+            return self.primary
+        for _ in range(len(self.replicas)):
+            idx = next(self._rr)
+            replica = self.replicas[idx]
+            now = time.monotonic()
+            if replica.ejected_until > now:
+                continue
+            if now - replica.checked_at >= REPLICA_CHECK_INTERVAL_S:
+                # Con una medición en curso se usa el último estado conocido (sin
+                # encolarse detrás del probe); si nunca se midió, se salta la réplica
+                if not await self._refresh(idx) and replica.checked_at == float("-inf"):
+                    continue
+                if replica.ejected_until > time.monotonic():
+                    continue
+            if replica.lag_s <= max_lag_s:
+                return replica.engine
+        return self.primary
+
+
+def get_read_router() -> ReadReplicaRouter:
+    global _read_router
+    if _read_router is None:
+        _read_router = ReadReplicaRouter(get_engine(), REPLICA_DSNS)
+    return _read_router
+
+
+async def dispose() -> None:
+    """Cierra los pools del primario y réplicas (shutdown del lifespan / workers)."""
+    global _engine, _session_factory, _read_router
+    if _read_router is not None:
+        await _read_router.dispose()
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = _session_factory = _read_router = None
+
+
+def max_staleness(headers: Mapping[str, str]) -> float:
+    # Read-your-writes: el cliente envía "X-Max-Staleness: 0" tras escribir
+    raw = headers.get("x-max-staleness")
+    if raw is None:
+        return REPLICA_MAX_LAG_S
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return REPLICA_MAX_LAG_S
+
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with SessionLocal() as session:
+    async with new_session() as session:
         yield session
+
+
+async def get_read_engine(request: Request) -> AsyncEngine:
+    return await get_read_router().read_engine(max_staleness(request.headers))
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Sesión sólo-lectura: réplica si hay una sana dentro del lag tolerado; si no, primario."""
+    read_engine = await get_read_engine(request)
+    async with new_session(bind=read_engine) as session:
+        try:
+            yield session
+        except DBAPIError as e:
+            get_read_router().report_error(read_engine, e)
+            raise
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Mapping
+
+from fastapi import HTTPException, status
+
+
+@dataclass(frozen=True)
+class AdmissionLimits:
+    max_concurrent: int
+    rate_per_s: float
+    burst: int
+
+
+# Defaults globales. Concurrencia <= pool del tenant (pool_size 5 + overflow 10)
+# para que un tenant no haga cola dentro del pool.
+DEFAULT_LIMITS = AdmissionLimits(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "12")),
+    rate_per_s=float(os.getenv("ADMISSION_RATE_PER_S", "50")),
+    burst=int(os.getenv("ADMISSION_BURST", "100")),
+)
+# Espera máxima por un slot de concurrencia antes de responder 503
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "0.5"))
+
+# Defaults por billing_plan, p.ej.:
+#   ADMISSION_PLAN_LIMITS='{"free": {"max_concurrent": 3, "rate_per_s": 10, "burst": 20}}'
+PLAN_LIMITS: Dict[str, AdmissionLimits] = {
+    plan: AdmissionLimits(**{**DEFAULT_LIMITS.__dict__, **cfg})
+    for plan, cfg in json.loads(os.getenv("ADMISSION_PLAN_LIMITS", "{}")).items()
+}
+
+
+def limits_for(row: Mapping) -> AdmissionLimits:
+    """tenant_limits (columnas no nulas) > billing_plan > default global."""
+    base = PLAN_LIMITS.get(row.get("billing_plan") or "", DEFAULT_LIMITS)
+    return AdmissionLimits(
+        max_concurrent=row.get("max_concurrent_requests") or base.max_concurrent,
+        rate_per_s=row.get("rate_limit_per_s") or base.rate_per_s,
+        burst=row.get("rate_limit_burst") or base.burst,
+    )
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate = rate_per_s
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_take(self) -> float:
+        """Toma un token; devuelve 0 si hay, o los segundos hasta el próximo."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _Slots:
+    """
+    Semáforo redimensionable (contador de requests en vuelo + cola de waiters).
+    Al cambiar el límite los requests en vuelo siguen contando: al bajarlo no se
+    admite nada nuevo hasta que in_flight < limit. release() es síncrono para
+    que un request cancelado siempre devuelva su slot.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def full(self) -> bool:
+        return self.in_flight >= self.limit
+
+    async def acquire(self) -> None:
+        while self.in_flight >= self.limit:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except BaseException:
+                # Despertado y cancelado a la vez (timeout): pasar el turno al siguiente
+                if fut.done() and not fut.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def resize(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.in_flight
+        for fut in self._waiters:
+            if free <= 0:
+                break
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+
+class _TenantGate:
+    def __init__(self, limits: AdmissionLimits):
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate_per_s, limits.burst)
+        self.slots = _Slots(limits.max_concurrent)
+
+    def reconfigure(self, limits: AdmissionLimits) -> None:
+        if limits.max_concurrent != self.limits.max_concurrent:
+            self.slots.resize(limits.max_concurrent)
+        if (limits.rate_per_s, limits.burst) != (self.limits.rate_per_s, self.limits.burst):
+            self.bucket.rate, self.bucket.capacity = limits.rate_per_s, limits.burst
+        self.limits = limits
+
+
+class TenantAdmission:
+    """
+    Control de admisión por tenant (en memoria de proceso):
+      - token bucket => 429 si excede el rate
+      - slots de concurrencia => 503 si no hay slot en ADMISSION_QUEUE_TIMEOUT_S
+    Falla rápido en vez de acumular checkouts del pool en el event loop.
+    """
+
+    def __init__(self, queue_timeout_s: float = ADMISSION_QUEUE_TIMEOUT_S):
+        self.queue_timeout_s = queue_timeout_s
+        self._gates: Dict[str, _TenantGate] = {}
+
+    def _gate(self, tenant_id: str, limits: AdmissionLimits) -> _TenantGate:
+        gate = self._gates.get(tenant_id)
+        if gate is None:
+            gate = self._gates[tenant_id] = _TenantGate(limits)
+        elif gate.limits != limits:
+            gate.reconfigure(limits)
+        return gate
+
+    @staticmethod
+    def _reject(code: int, detail: str, retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    @asynccontextmanager
+    async def admit(self, tenant_id: str, limits: AdmissionLimits) -> AsyncIterator[None]:
+        gate = self._gate(tenant_id, limits)
+        wait = gate.bucket.try_take()
+        if wait:
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Tenant rate limit exceeded", wait)
+
+        slots = gate.slots
+        try:
+            if slots.full() and self.queue_timeout_s <= 0:
+                raise TimeoutError
+            async with asyncio.timeout(self.queue_timeout_s):
+                await slots.acquire()
+        except TimeoutError:
+            # Un 503 no consume rate: se devuelve el token
+            gate.bucket.refund()
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Tenant concurrency limit reached", 1)
+        try:
+            yield
+        finally:
+            slots.release()
+
+
+admission = TenantAdmission()
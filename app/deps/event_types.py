@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+
+from app import db
+
+log = logging.getLogger(__name__)
+
+# Red de seguridad si se pierde un NOTIFY (listener caído/reconectando)
+EVENT_TYPES_TTL_S = float(os.getenv("EVENT_TYPES_TTL_S", "300"))
+# Un código desconocido fuerza a lo sumo una recarga por este intervalo
+EVENT_TYPES_MISS_REFRESH_S = float(os.getenv("EVENT_TYPES_MISS_REFRESH_S", "1"))
+EVENT_TYPES_CHANNEL = "control_plane_event_types"
+
+# Marca "nunca cargado/invalidado": time.monotonic() cuenta desde el boot y en un
+# host recién arrancado puede ser menor que el TTL, así que 0.0 no sirve
+_NEVER = float("-inf")
+
+_CATALOG_SQL = text("SELECT code, description FROM control_plane.event_types ORDER BY code")
+
+
+class EventTypeCache:
+    """
+    Catálogo `event_types` en memoria de proceso. Se carga en el primer uso y se
+    invalida con LISTEN/NOTIFY (trigger de la migración 000000000009) o por TTL.
+    Permite validar `event_type` antes de tocar la BD: el FK es DEFERRED y un
+    código inválido recién falla al commit, perdiendo toda la transacción.
+    """
+
+    def __init__(self, ttl_s: float = EVENT_TYPES_TTL_S):
+        self.ttl_s = ttl_s
+        self._catalog: Dict[str, str] = {}
+        self._loaded_at = _NEVER
+        self._last_miss_refresh = _NEVER
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    def invalidate(self) -> None:
+        self._loaded_at = _NEVER
+
+    async def _refresh(self) -> None:
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < self.ttl_s:
+                return  # otro request ya recargó
+            async with db.get_engine().connect() as conn:
+                rows = (await conn.execute(_CATALOG_SQL)).all()
+            self._catalog = {r.code: r.description for r in rows}
+            self._loaded_at = time.monotonic()
+
+    async def catalog(self) -> Dict[str, str]:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        if time.monotonic() - self._loaded_at >= self.ttl_s:
+            await self._refresh()
+        return self._catalog
+
+    async def unknown(self, codes: Iterable[str]) -> List[str]:
+        """Códigos que no están en el catálogo (una recarga extra si hay misses: tipo recién creado)."""
+        catalog = await self.catalog()
+        missing = sorted({c for c in codes if c not in catalog})
+        if missing and time.monotonic() - self._last_miss_refresh >= EVENT_TYPES_MISS_REFRESH_S:
+            self._last_miss_refresh = time.monotonic()
+            self.invalidate()
+            catalog = await self.catalog()
+            missing = [c for c in missing if c not in catalog]
+        return missing
+
+    async def validate(self, codes: Iterable[str]) -> None:
+        missing = await self.unknown(codes)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unknown event_type: {', '.join(missing)}",
+            )
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        backoff = 1.0
+        while True:
+            try:
+                dsn = db.get_engine().url.set(drivername="postgresql").render_as_string(hide_password=False)
+                async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {EVENT_TYPES_CHANNEL}")
+                    # Lo que cambió mientras no escuchábamos
+                    self.invalidate()
+                    backoff = 1.0
+                    async for _ in conn.notifies():
+                        self.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("event_types: listener desconectado (%s); reintento en %.0fs", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+
+event_types = EventTypeCache()
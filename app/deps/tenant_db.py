@@ -1,43 +1,54 @@
 import asyncio
+import json
 import os
-from typing import Dict, Optional
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
 
-from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi import HTTPException, Request, status
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
 
+from app import profiling
+from app.db import get_read_engine, get_read_router
+from app.deps.admission import admission, limits_for
 from app.secrets.manager import SecretManager
 
-CONTROL_PLANE_DSN = os.getenv("CONTROL_PLANE_DATABASE_URL", "<REPLACE_ME>")
-
-# Engine del control plane (compartido)
-_cp_engine: Optional[AsyncEngine] = None
-_cp_lock = asyncio.Lock()
-
-async def get_control_plane_engine() -> AsyncEngine:
-    global _cp_engine
-    if _cp_engine is None:
-        async with _cp_lock:
-            if _cp_engine is None:
-                _cp_engine = create_async_engine(
-                    CONTROL_PLANE_DSN,
-                    pool_pre_ping=True,
-                    pool_size=5,
-                    max_overflow=5,
-                    future=True,
-                )
-    return _cp_engine
+TENANT_POOL_TIMEOUT_S = float(os.getenv("TENANT_POOL_TIMEOUT_S", "2"))
+# Timeouts de sesión en la BD del tenant: una query desbocada no retiene un slot del pool
+TENANT_STATEMENT_TIMEOUT_MS = int(os.getenv("TENANT_STATEMENT_TIMEOUT_MS", "30000"))
+TENANT_IDLE_IN_TX_TIMEOUT_MS = int(os.getenv("TENANT_IDLE_IN_TX_TIMEOUT_MS", "60000"))
+# Defaults por billing_plan, p.ej.: TENANT_PLAN_TIMEOUTS='{"free": {"statement_timeout_ms": 5000}}'
+TENANT_PLAN_TIMEOUTS: Dict[str, dict] = json.loads(os.getenv("TENANT_PLAN_TIMEOUTS", "{}"))
 
 # Cache de engines por tenant_id (en memoria de proceso)
 _engines: Dict[str, AsyncEngine] = {}
+# Timeouts con los que se creó cada engine (si cambian en tenant_limits, se recrea)
+_engine_timeouts: Dict[str, Tuple[int, int]] = {}
+# config_updated_at de la fila con la que se creó cada engine: la fila llega de réplicas
+# round-robin y una atrasada no debe hacer "volver" el engine a los timeouts viejos
+_engine_versions: Dict[str, datetime] = {}
 _engines_lock = asyncio.Lock()
+# Requests que usan cada engine (ver engine_lease) y engines reemplazados que todavía
+# tienen usuarios: se cierran cuando los suelta el último. Un dispose() con usuarios
+# activos no sirve: SQLAlchemy crea un pool nuevo para ellos que nadie cerraría.
+_engine_users: Dict[AsyncEngine, int] = {}
+_retired: Set[AsyncEngine] = set()
 
 async def _resolve_tenant_row(slug: str, cp_engine: AsyncEngine) -> dict:
     q = text("""
-        SELECT id, db_host, db_port, db_name, db_user, db_secret_ref, status
-        FROM control_plane.tenants
-        WHERE lower(slug) = lower(:slug)
-          AND deleted_at IS NULL
+        SELECT t.id, t.db_host, t.db_port, t.db_name, t.db_user, t.db_secret_ref, t.status,
+               t.billing_plan, l.max_concurrent_requests, l.rate_limit_per_s, l.rate_limit_burst,
+               l.statement_timeout_ms, l.idle_in_tx_timeout_ms,
+               GREATEST(t.updated_at, l.updated_at) AS config_updated_at
+        FROM control_plane.tenants t
+        LEFT JOIN control_plane.tenant_limits l ON l.tenant_id = t.id
+        WHERE lower(t.slug) = lower(:slug)
+          AND t.deleted_at IS NULL
         LIMIT 1
     """)
     async with cp_engine.connect() as conn:
@@ -51,45 +62,262 @@ async def _resolve_tenant_row(slug: str, cp_engine: AsyncEngine) -> dict:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Tenant status={status_val}")
     return dict(row)
 
-async def get_tenant_engine_by_slug(slug: str, cp_engine: AsyncEngine, sm: SecretManager) -> AsyncEngine:
-    row = await _resolve_tenant_row(slug, cp_engine)
+def session_timeouts(row: Mapping) -> Tuple[int, int]:
+    """(statement_timeout, idle_in_transaction_session_timeout) en ms: tenant_limits > billing_plan > global."""
+    plan = TENANT_PLAN_TIMEOUTS.get(row.get("billing_plan") or "", {})
+    return (
+        row.get("statement_timeout_ms") or plan.get("statement_timeout_ms") or TENANT_STATEMENT_TIMEOUT_MS,
+        row.get("idle_in_tx_timeout_ms") or plan.get("idle_in_tx_timeout_ms") or TENANT_IDLE_IN_TX_TIMEOUT_MS,
+    )
+
+def _create_engine(row: Mapping, password: str, timeouts: Tuple[int, int], **pool_kw) -> AsyncEngine:
+    # Importante: usar asyncpg para conexiones por tenant (alto rendimiento)
+    dsn = (
+        f"postgresql+psycopg://{row['db_user']}:{password}"
+        f"@{row['db_host']}:{row['db_port']}/{row['db_name']}"
+    )
+    statement_timeout_ms, idle_in_tx_timeout_ms = timeouts
+    return create_async_engine(
+        dsn,
+        # Se fijan al conectar (sin round-trip extra por checkout)
+        connect_args={
+            "options": (
+                f"-c statement_timeout={statement_timeout_ms} "
+                f"-c idle_in_transaction_session_timeout={idle_in_tx_timeout_ms}"
+            )
+        },
+        future=True,
+        **pool_kw,
+    )
+
+async def unpooled_tenant_engine(row: Mapping, sm: SecretManager) -> AsyncEngine:
+    """
+    Engine sin pool (NullPool) para procesos batch como el collector: cada connect()
+    abre y cierra su conexión, así no quedan backends ociosos en la BD del tenant
+    entre ciclos. No pasa por el cache; el que llama hace dispose().
+    """
+    password = await sm.get_password(row["db_secret_ref"])
+    return _create_engine(row, password, session_timeouts(row), poolclass=NullPool)
+
+def _cached_engine(tenant_id: str, timeouts: Tuple[int, int], version: Optional[datetime]) -> Optional[AsyncEngine]:
+    engine = _engines.get(tenant_id)
+    if engine is None or _engine_timeouts.get(tenant_id) == timeouts:
+        return engine
+    # Timeouts distintos: sólo se recrea si la fila es más nueva que la del engine
+    cached = _engine_versions.get(tenant_id)
+    if version is None or (cached is not None and version <= cached):
+        return engine
+    return None
+
+async def _engine_for_row(row: dict, sm: SecretManager) -> AsyncEngine:
     tenant_id = str(row["id"])
+    timeouts = session_timeouts(row)
+    version = row.get("config_updated_at")
+    # Fast path sin lock: evita que requests de tenants ya conectados esperen
+    # detrás de la creación (y fetch de secreto) de otro tenant
+    engine = _cached_engine(tenant_id, timeouts, version)
+    if engine is not None:
+        return engine
+
+    stale: Optional[AsyncEngine] = None
+    try:
+        async with _engines_lock:
+            engine = _cached_engine(tenant_id, timeouts, version)
+            if engine is not None:
+                return engine
+            if tenant_id in _engines:
+                # Cambiaron los timeouts: el engine viejo se retira (cerrado fuera del lock)
+                _engine_timeouts.pop(tenant_id, None)
+                _engine_versions.pop(tenant_id, None)
+                stale = _retire(_engines.pop(tenant_id))
+
+            # Obtiene password on-demand desde Secret Manager
+            with profiling.phase("secret_fetch"):
+                password = await sm.get_password(row["db_secret_ref"])
+
+            engine = _create_engine(
+                row,
+                password,
+                timeouts,
+                pool_pre_ping=True,
+                pool_size=5,
+                max_overflow=10,
+                # Checkout que espera más que el deadline => TimeoutError (503), no cola infinita
+                pool_timeout=TENANT_POOL_TIMEOUT_S,
+            )
+            _engines[tenant_id] = engine
+            _engine_timeouts[tenant_id] = timeouts
+            if version is not None:
+                _engine_versions[tenant_id] = version
+    finally:
+        if stale is not None:
+            await stale.dispose()
+    return engine
 
+
+def _retire(engine: AsyncEngine) -> Optional[AsyncEngine]:
+    """Devuelve el engine si se puede cerrar ya; si no, queda retirado hasta que se libere."""
+    if _engine_users.get(engine):
+        _retired.add(engine)
+        return None
+    return engine
+
+
+@asynccontextmanager
+async def engine_lease(engine: AsyncEngine) -> AsyncIterator[AsyncEngine]:
+    """Marca el engine en uso: si se retira mientras tanto, se cierra al soltarlo."""
+    _engine_users[engine] = _engine_users.get(engine, 0) + 1
+    try:
+        yield engine
+    finally:
+        n = _engine_users.pop(engine) - 1
+        if n:
+            _engine_users[engine] = n
+        elif engine in _retired:
+            _retired.discard(engine)
+            await engine.dispose()
+
+async def dispose_tenant_engine(tenant_id: str) -> None:
     async with _engines_lock:
-        if tenant_id in _engines:
-            return _engines[tenant_id]
-
-        # Obtiene password on-demand desde Secret Manager
-        password = await sm.get_password(row["db_secret_ref"])
-
-        # Importante: usar asyncpg para conexiones por tenant (alto rendimiento)
-        dsn = (
-            f"postgresql+psycopg://{row['db_user']}:{password}"
-            f"@{row['db_host']}:{row['db_port']}/{row['db_name']}"
-        )
-        
-        engine = create_async_engine(
-            dsn,
-            pool_pre_ping=True,
-            pool_size=5,
-            max_overflow=10,
-            future=True,
-        )
-        _engines[tenant_id] = engine
-        return engine
+        engine = _engines.pop(tenant_id, None)
+        _engine_timeouts.pop(tenant_id, None)
+        _engine_versions.pop(tenant_id, None)
+        if engine is not None:
+            engine = _retire(engine)
+    if engine is not None:
+        await engine.dispose()
+
+async def dispose_all_tenant_engines() -> None:
+    # Shutdown: también los retirados, aunque algún request siga en vuelo
+    async with _engines_lock:
+        engines = [*_engines.values(), *_retired]
+        _engines.clear()
+        _engine_timeouts.clear()
+        _engine_versions.clear()
+        _retired.clear()
+    await asyncio.gather(*(e.dispose() for e in engines), return_exceptions=True)
+
+# Matcher de host precompilado:
+#   - dominios propios mapeados a slug (TENANT_CUSTOM_DOMAINS="billing.acme.com=acme,...")
+#   - subdominio de un dominio base (TENANT_BASE_DOMAINS="app.example.com,...")
+#   - sin dominios base configurados: primer label del host (comportamiento legacy)
+class TenantHostMatcher:
+    def __init__(self, base_domains: List[str], custom_domains: Dict[str, str]):
+        self.custom = {host.lower(): slug for host, slug in custom_domains.items()}
+        self.pattern = None
+        if base_domains:
+            alts = "|".join(re.escape(d.lower().strip(".")) for d in base_domains)
+            self.pattern = re.compile(rf"^([a-z0-9](?:[-a-z0-9]*[a-z0-9])?)\.(?:{alts})$")
+
+    def match(self, host: str) -> Optional[str]:
+        host = host.rsplit(":", 1)[0].lower() if host else ""
+        if not host:
+            return None
+        slug = self.custom.get(host)
+        if slug is not None:
+            return slug
+        if self.pattern is None:
+            return host.split(".")[0]
+        m = self.pattern.match(host)
+        return m.group(1) if m else None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.custom) or self.pattern is not None
+
+
+def _parse_custom_domains(raw: str) -> Dict[str, str]:
+    pairs = (item.split("=", 1) for item in raw.split(",") if "=" in item)
+    return {host.strip(): slug.strip() for host, slug in pairs}
+
+
+host_matcher = TenantHostMatcher(
+    [d.strip() for d in os.getenv("TENANT_BASE_DOMAINS", "").split(",") if d.strip()],
+    _parse_custom_domains(os.getenv("TENANT_CUSTOM_DOMAINS", "")),
+)
+
+
+def slug_from_headers(headers: Mapping[str, str], use_host: bool = True) -> Optional[str]:
+    # "x_tenant_slug" se mantiene por compatibilidad (algunos proxies descartan headers con "_")
+    slug = headers.get("x-tenant-slug") or headers.get("x_tenant_slug")
+    if not slug and use_host:
+        slug = host_matcher.match(headers.get("host", ""))
+    return slug or None
+
+
+_secret_manager: Optional[SecretManager] = None
+
+def secret_manager() -> SecretManager:
+    # Una instancia por proceso (backend y endpoint se toman de env)
+    global _secret_manager
+    if _secret_manager is None:
+        _secret_manager = SecretManager()
+    return _secret_manager
+
+
+@dataclass
+class TenantContext:
+    slug: str
+    row: Optional[dict] = None
+    engine: Optional[AsyncEngine] = None
+    error: Optional[Exception] = None
+
+
+async def resolve_tenant(slug: str, cp_engine: AsyncEngine) -> TenantContext:
+    # No lanza: el error se difiere al endpoint que realmente necesite el tenant.
+    # Sólo la fila: secreto y engine se resuelven después de la admisión
+    try:
+        row = await _resolve_tenant_row(slug, cp_engine)
+    except Exception as e:
+        return TenantContext(slug, error=e)
+    return TenantContext(slug, row=row)
+
+
+class LazyTenant:
+    """
+    Tenant del request resuelto a demanda. `TenantResolverMiddleware` sólo extrae
+    el slug; la consulta al control plane ocurre la primera vez que alguien lo
+    pide (una vez por request), así que /health, /tenants, /jobs... no la pagan.
+    """
+
+    def __init__(self, slug: str):
+        self.slug = slug
+        self._ctx: Optional[TenantContext] = None
+
+    async def resolve(self, read_engine: Callable[[], Awaitable[AsyncEngine]]) -> TenantContext:
+        if self._ctx is None:
+            with profiling.phase("tenant_resolution", slug=self.slug):
+                cp_engine = await read_engine()
+                self._ctx = await resolve_tenant(self.slug, cp_engine)
+            if self._ctx.error is not None:
+                get_read_router().report_error(cp_engine, self._ctx.error)
+        return self._ctx
+
 
 # Dependency FastAPI
-async def get_tenant_engine(
-    request: Request,
-    x_tenant_slug: Optional[str] = Header(default=None, convert_underscores=False),
-    cp_engine: AsyncEngine = Depends(get_control_plane_engine),
-) -> AsyncEngine:
-    slug = x_tenant_slug
-    if not slug:
-        host = request.headers.get("host", "")
-        slug = host.split(".")[0] if host else None
-    if not slug:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing tenant slug")
-
-    sm = SecretManager()  # backend y endpoint se toman de env
-    return await get_tenant_engine_by_slug(slug, cp_engine, sm)
+async def get_tenant_engine(request: Request) -> AsyncGenerator[AsyncEngine, None]:
+    # Slug ya extraído por TenantResolverMiddleware; sin middleware (o sin slug
+    # por host configurado) se cae al header/host legacy
+    tenant: Optional[LazyTenant] = getattr(request.state, "tenant", None)
+    if tenant is None:
+        slug = slug_from_headers(request.headers)
+        if not slug:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing tenant slug")
+        tenant = request.state.tenant = LazyTenant(slug)
+    # Resolución slug -> tenant es sólo-lectura: va a réplica si hay
+    ctx = await tenant.resolve(lambda: get_read_engine(request))
+    if ctx.error is not None:
+        raise ctx.error
+
+    # Admisión (rate limit + concurrencia) antes de tocar el pool del tenant: un
+    # tenant rechazado no paga fetch de secreto ni creación de engine.
+    # El slot se libera al terminar el request
+    prof = profiling.current()
+    start = time.perf_counter() if prof else 0.0
+    async with admission.admit(str(ctx.row["id"]), limits_for(ctx.row)):
+        if prof:
+            prof.add("admission", start, time.perf_counter())
+        if ctx.engine is None:
+            ctx.engine = await _engine_for_row(ctx.row, secret_manager())
+        async with engine_lease(ctx.engine) as engine:
+            yield engine
@@ -0,0 +1,109 @@
+"""
+Reconciliación de `control_plane.tenant_fleet_counters`.
+
+Los conteos por dimensión los mantiene el trigger `trg_tenants_fleet_counters`
+(migración 000000000010); `GET /tenants/stats` sólo lee esa tabla. Este proceso
+recalcula periódicamente con un GROUP BY sobre `tenants` y corrige el drift
+(p.ej. TRUNCATE, triggers deshabilitados con session_replication_role, ediciones manuales).
+
+    uv run python -m app.fleet.counters            # loop cada FLEET_RECONCILE_INTERVAL_S
+    uv run python -m app.fleet.counters --once
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from typing import List
+
+from sqlalchemy import text
+
+from app.db import get_engine
+
+log = logging.getLogger(__name__)
+
+FLEET_DIMENSIONS = ("status", "schema_version", "app_version", "billing_plan", "db_host")
+FLEET_RECONCILE_INTERVAL_S = float(os.getenv("FLEET_RECONCILE_INTERVAL_S", "3600"))
+# Espera máxima por el lock de la tabla de contadores (escrituras a tenants esperan mientras tanto)
+FLEET_RECONCILE_LOCK_TIMEOUT = os.getenv("FLEET_RECONCILE_LOCK_TIMEOUT", "5s")
+
+# SHARE ROW EXCLUSIVE: espera a las transacciones que ya tocaron contadores y
+# bloquea nuevas hasta el commit, así el GROUP BY y los contadores ven el mismo estado
+_LOCK_SQL = text("LOCK TABLE control_plane.tenant_fleet_counters IN SHARE ROW EXCLUSIVE MODE")
+
+_RECONCILE_SQL = text("""
+    WITH actual AS (
+        SELECT x.dimension, x.value, count(*) AS n
+        FROM control_plane.tenants t,
+        LATERAL (VALUES
+            ('status', t.status),
+            ('schema_version', t.schema_version),
+            ('app_version', coalesce(t.app_version, '')),
+            ('billing_plan', coalesce(t.billing_plan, '')),
+            ('db_host', t.db_host)
+        ) AS x(dimension, value)
+        WHERE t.deleted_at IS NULL
+        GROUP BY x.dimension, x.value
+    ),
+    drift AS (
+        SELECT coalesce(a.dimension, c.dimension) AS dimension,
+               coalesce(a.value, c.value) AS value,
+               coalesce(c.n, 0) AS counted,
+               coalesce(a.n, 0) AS actual
+        FROM actual a
+        FULL JOIN control_plane.tenant_fleet_counters c
+          ON c.dimension = a.dimension AND c.value = a.value
+        WHERE a.n IS DISTINCT FROM c.n
+    ),
+    upserted AS (
+        INSERT INTO control_plane.tenant_fleet_counters AS c (dimension, value, n)
+        SELECT dimension, value, actual FROM drift WHERE actual > 0
+        ON CONFLICT (dimension, value) DO UPDATE SET n = EXCLUDED.n
+    ),
+    deleted AS (
+        -- Grupos que quedaron en 0 (o sobran): fuera, así la tabla es O(grupos vivos)
+        DELETE FROM control_plane.tenant_fleet_counters c
+        USING drift d
+        WHERE c.dimension = d.dimension AND c.value = d.value AND d.actual = 0
+    )
+    SELECT dimension, value, counted, actual FROM drift WHERE counted <> actual
+""")
+
+
+async def reconcile_once() -> List[dict]:
+    """Corrige los contadores; devuelve los grupos con drift (counted != actual)."""
+    async with get_engine().begin() as conn:
+        await conn.execute(
+            text("SELECT set_config('lock_timeout', :v, true)"), {"v": FLEET_RECONCILE_LOCK_TIMEOUT}
+        )
+        await conn.execute(_LOCK_SQL)
+        drift = [dict(r) for r in (await conn.execute(_RECONCILE_SQL)).mappings()]
+    for d in drift:
+        log.warning("fleet: drift %s=%r contado=%d real=%d", d["dimension"], d["value"], d["counted"], d["actual"])
+    log.info("fleet: reconciliación OK (%d grupos corregidos)", len(drift))
+    return drift
+
+
+async def run_forever(interval_s: float) -> None:
+    while True:
+        try:
+            await reconcile_once()
+        except Exception:
+            log.exception("fleet: reconciliación fallida")
+        await asyncio.sleep(interval_s)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Reconciliación de tenant_fleet_counters")
+    ap.add_argument("--once", action="store_true", help="una sola pasada y salir")
+    ap.add_argument("--interval", type=float, default=FLEET_RECONCILE_INTERVAL_S)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.once:
+        asyncio.run(reconcile_once())
+    else:
+        asyncio.run(run_forever(args.interval))
+
+
+if __name__ == "__main__":
+    main()
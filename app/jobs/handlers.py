@@ -0,0 +1,198 @@
+"""
+Handlers de jobs por `kind`. Cada handler recibe un `JobContext` y debe ser
+idempotente: un job puede re-ejecutarse tras un fallo o un lease vencido.
+
+Operaciones sobre el servidor del tenant (CREATE/DROP DATABASE) usan
+TENANT_ADMIN_DATABASE_URL, un template con {host} y {port}, p.ej.
+    postgresql://provisioner@{host}:{port}/postgres
+Si no está definida, esos pasos se omiten (la BD se gestiona fuera del control plane).
+"""
+
+import asyncio
+import json
+import os
+import re
+import shlex
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import psycopg
+from psycopg import sql
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.deps.tenant_db import dispose_tenant_engine, secret_manager
+from app.jobs import queue
+
+TENANT_ADMIN_DATABASE_URL = os.getenv("TENANT_ADMIN_DATABASE_URL", "")
+# Comando de migración del data plane; recibe TENANT_DATABASE_URL en el entorno.
+# {to} se reemplaza por la revisión destino. P.ej.: "alembic -c tenant.ini upgrade {to}"
+TENANT_MIGRATE_CMD = os.getenv("TENANT_MIGRATE_CMD", "")
+# Igual que tenants.schema_version (tenants_schema_version_format_chk)
+_ALEMBIC_REV = re.compile(r"^[0-9a-f]{12}$")
+
+
+class JobError(Exception):
+    """Error de negocio: no tiene sentido reintentar."""
+
+
+@dataclass
+class JobContext:
+    job: Dict[str, Any]
+    worker_id: str
+    cp_engine: AsyncEngine
+
+    @property
+    def tenant_id(self) -> str:
+        return str(self.job["tenant_id"])
+
+    async def progress(self, pct: int, message: Optional[str] = None) -> None:
+        async with self.cp_engine.connect() as conn:
+            await queue.report_progress(conn, str(self.job["id"]), self.worker_id, pct, message)
+
+    async def tenant_row(self, missing_ok: bool = False) -> Optional[dict]:
+        async with self.cp_engine.connect() as conn:
+            row = (
+                await conn.execute(
+                    text("""
+                        SELECT id, slug, db_host, db_port, db_name, db_user, db_secret_ref,
+                               schema_version, status, deleted_at
+                        FROM control_plane.tenants WHERE id = :id
+                    """),
+                    {"id": self.tenant_id},
+                )
+            ).mappings().first()
+        if not row:
+            if missing_ok:
+                return None
+            raise JobError("Tenant no encontrado")
+        return dict(row)
+
+    async def record_event(self, conn, event_type: str, payload: Optional[dict] = None) -> None:
+        await conn.execute(
+            text("""
+                INSERT INTO control_plane.tenant_events (tenant_id, event_type, actor, payload)
+                VALUES (:tenant_id, :event_type, :actor, CAST(:payload AS jsonb))
+            """),
+            {
+                "tenant_id": self.tenant_id,
+                "event_type": event_type,
+                "actor": f"job-worker:{self.worker_id}",
+                "payload": json.dumps({"job_id": str(self.job["id"]), **(payload or {})}),
+            },
+        )
+
+
+async def _admin_connection(row: dict) -> Optional[psycopg.AsyncConnection]:
+    if not TENANT_ADMIN_DATABASE_URL:
+        return None
+    dsn = TENANT_ADMIN_DATABASE_URL.format(host=row["db_host"], port=row["db_port"])
+    # CREATE/DROP DATABASE no pueden correr dentro de una transacción
+    return await psycopg.AsyncConnection.connect(dsn, autocommit=True)
+
+
+async def provision(ctx: JobContext) -> None:
+    row = await ctx.tenant_row()
+    if row["status"] != "provisioning":
+        raise JobError(f"status={row['status']}; se esperaba provisioning")
+
+    await ctx.progress(10, "creando base de datos")
+    admin = await _admin_connection(row)
+    if admin is not None:
+        async with admin:
+            cur = await admin.execute("SELECT 1 FROM pg_database WHERE datname = %s", (row["db_name"],))
+            if await cur.fetchone() is None:
+                await admin.execute(
+                    sql.SQL("CREATE DATABASE {} OWNER {}").format(
+                        sql.Identifier(row["db_name"]), sql.Identifier(row["db_user"])
+                    )
+                )
+
+    await ctx.progress(80, "activando tenant")
+    async with ctx.cp_engine.begin() as conn:
+        await conn.execute(
+            text("UPDATE control_plane.tenants SET status = 'active' WHERE id = :id AND status = 'provisioning'"),
+            {"id": ctx.tenant_id},
+        )
+        await ctx.record_event(conn, "provisioned", {"db_host": row["db_host"], "db_name": row["db_name"]})
+
+
+async def finalize_delete(ctx: JobContext) -> None:
+    # Idempotente: re-ejecución tras un lease vencido o fila ya purgada a mano
+    row = await ctx.tenant_row(missing_ok=True)
+    if row is None or row["status"] == "deleted":
+        return
+    if row["deleted_at"] is None or row["status"] != "deleting":
+        raise JobError("El tenant no está en proceso de borrado (deleted_at/status)")
+
+    # Cierra conexiones cacheadas de este proceso hacia la BD del tenant
+    await dispose_tenant_engine(ctx.tenant_id)
+
+    await ctx.progress(20, "eliminando base de datos")
+    admin = await _admin_connection(row)
+    if admin is not None:
+        async with admin:
+            await admin.execute(
+                sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(row["db_name"]))
+            )
+
+    await ctx.progress(80, "limpiando control plane")
+    # La fila de tenants queda como lápida (status terminal 'deleted'): tenant_events y
+    # tenant_jobs tienen ON DELETE CASCADE y un hard delete borraría la auditoría y este job
+    async with ctx.cp_engine.begin() as conn:
+        res = await conn.execute(
+            text("UPDATE control_plane.tenants SET status = 'deleted' WHERE id = :id AND status = 'deleting'"),
+            {"id": ctx.tenant_id},
+        )
+        if res.rowcount == 0:
+            return  # otro run terminó primero
+        await conn.execute(text("DELETE FROM control_plane.tenant_limits WHERE tenant_id = :id"), {"id": ctx.tenant_id})
+        await ctx.record_event(conn, "deleted", {"db_name": row["db_name"], "database_dropped": admin is not None})
+
+
+async def migrate(ctx: JobContext) -> None:
+    target = (ctx.job.get("payload") or {}).get("to")
+    if not target or not _ALEMBIC_REV.match(target):
+        raise JobError("payload.to (revisión destino de 12 hex) es obligatorio")
+    if not TENANT_MIGRATE_CMD:
+        raise JobError("TENANT_MIGRATE_CMD no definida")
+    row = await ctx.tenant_row()
+    if row["schema_version"] == target:
+        return  # idempotente: ya migrado
+
+    password = await secret_manager().get_password(row["db_secret_ref"])
+    env = {
+        **os.environ,
+        "TENANT_DATABASE_URL": (
+            f"postgresql+psycopg://{row['db_user']}:{password}"
+            f"@{row['db_host']}:{row['db_port']}/{row['db_name']}"
+        ),
+    }
+    await ctx.progress(10, f"migrando {row['schema_version']} -> {target}")
+    proc = await asyncio.create_subprocess_exec(
+        # Se parte el template antes de sustituir: `to` nunca agrega argumentos
+        *(arg.format(to=target) for arg in shlex.split(TENANT_MIGRATE_CMD)),
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    out, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"migración falló (rc={proc.returncode}): {out.decode(errors='replace')[-2000:]}")
+
+    await ctx.progress(90, "registrando versión")
+    async with ctx.cp_engine.begin() as conn:
+        await conn.execute(
+            text("UPDATE control_plane.tenants SET schema_version = :to WHERE id = :id"),
+            {"id": ctx.tenant_id, "to": target},
+        )
+        await ctx.record_event(conn, "migrated", {"from": row["schema_version"], "to": target})
+
+
+Handler = Callable[[JobContext], Awaitable[None]]
+
+HANDLERS: Dict[str, Handler] = {
+    "provision": provision,
+    "finalize_delete": finalize_delete,
+    "migrate": migrate,
+}
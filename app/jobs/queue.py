@@ -0,0 +1,265 @@
+"""
+Cola durable sobre `control_plane.tenant_jobs` (sin broker externo).
+
+Claim por lotes con `FOR UPDATE SKIP LOCKED`: varios workers reclaman en paralelo
+sin bloquearse entre sí. Dentro de la misma transacción:
+  - a lo sumo un job `running` por tenant (advisory lock por tenant + índice único parcial)
+  - a lo sumo `per_host_cap` jobs `running` por `db_host` (advisory lock por host)
+Los advisory locks son de transacción: sólo serializan el claim, no la ejecución.
+"""
+
+import json
+import random
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Espacios de claves para pg_try_advisory_xact_lock(int4, int4)
+_LOCK_NS_TENANT = 7310_01
+_LOCK_NS_HOST = 7310_02
+
+# Elegibilidad antes del LIMIT: sin job corriendo del mismo tenant y host bajo el tope.
+# Sin esto, un backlog viejo de un host lleno (o de tenants ocupados) ocupa todo el
+# scan y los jobs elegibles de otros hosts esperan (head-of-line blocking).
+_CANDIDATES_SQL = text("""
+    SELECT j.id, j.tenant_id, j.db_host
+    FROM control_plane.tenant_jobs j
+    WHERE j.status = 'queued' AND j.run_after <= now()
+      AND NOT (j.tenant_id = ANY(CAST(:skip_tenants AS uuid[])))
+      AND NOT (j.db_host = ANY(CAST(:skip_hosts AS text[])))
+      AND NOT EXISTS (
+        SELECT 1 FROM control_plane.tenant_jobs r
+        WHERE r.status = 'running' AND r.tenant_id = j.tenant_id
+      )
+      AND j.db_host NOT IN (
+        SELECT db_host FROM control_plane.tenant_jobs
+        WHERE status = 'running'
+        GROUP BY db_host
+        HAVING count(*) >= :per_host_cap
+      )
+    ORDER BY j.run_after, j.created_at
+    FOR UPDATE OF j SKIP LOCKED
+    LIMIT :scan
+""")
+
+_LOCK_TENANTS_SQL = text("""
+    SELECT t FROM unnest(CAST(:tenant_ids AS uuid[])) AS t
+    WHERE pg_try_advisory_xact_lock(CAST(:ns AS int4), hashtext(t::text))
+""")
+
+_LOCK_HOSTS_SQL = text("""
+    SELECT h FROM unnest(CAST(:hosts AS text[])) AS h
+    WHERE pg_try_advisory_xact_lock(CAST(:ns AS int4), hashtext(h))
+""")
+
+# Sentencias nuevas => snapshot nuevo: ven los claims ya commiteados por otros workers
+_BUSY_TENANTS_SQL = text("""
+    SELECT DISTINCT tenant_id FROM control_plane.tenant_jobs
+    WHERE status = 'running' AND tenant_id = ANY(CAST(:tenant_ids AS uuid[]))
+""")
+
+_RUNNING_PER_HOST_SQL = text("""
+    SELECT db_host, count(*) AS n FROM control_plane.tenant_jobs
+    WHERE status = 'running' AND db_host = ANY(CAST(:hosts AS text[]))
+    GROUP BY db_host
+""")
+
+_MARK_RUNNING_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET status = 'running', locked_by = :worker_id, locked_at = now(), heartbeat_at = now(),
+        attempts = attempts + 1, last_error = NULL
+    WHERE id = ANY(CAST(:ids AS uuid[]))
+    RETURNING id, tenant_id, kind, db_host, payload, attempts, max_attempts
+""")
+
+_SUCCEED_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET status = 'succeeded', progress = 100, finished_at = now(), locked_by = NULL
+    WHERE id = :id AND locked_by = :worker_id
+""")
+
+_RETRY_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET status = 'queued', locked_by = NULL, last_error = :error,
+        run_after = now() + make_interval(secs => :delay_s)
+    WHERE id = :id AND locked_by = :worker_id
+""")
+
+_FAIL_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET status = 'failed', finished_at = now(), locked_by = NULL, last_error = :error
+    WHERE id = :id AND locked_by = :worker_id
+    RETURNING tenant_id, kind, attempts
+""")
+
+_ERROR_EVENT_SQL = text("""
+    INSERT INTO control_plane.tenant_events (tenant_id, event_type, actor, payload)
+    VALUES (:tenant_id, 'error', :actor, CAST(:payload AS jsonb))
+""")
+
+_PROGRESS_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET progress = :progress, progress_message = :message, heartbeat_at = now()
+    WHERE id = :id AND locked_by = :worker_id
+""")
+
+_HEARTBEAT_SQL = text("""
+    UPDATE control_plane.tenant_jobs
+    SET heartbeat_at = now()
+    WHERE id = ANY(CAST(:ids AS uuid[])) AND locked_by = :worker_id
+""")
+
+# Leases vencidos (worker caído): se re-encolan o fallan si agotaron intentos.
+# Los que fallan registran el mismo evento 'error' que mark_failed.
+_REAP_SQL = text("""
+    WITH reaped AS (
+        UPDATE control_plane.tenant_jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+            finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+            last_error = 'lease expirado (worker ' || coalesce(locked_by, '?') || ')',
+            locked_by = NULL,
+            run_after = now()
+        WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => :lease_s)
+        RETURNING id, tenant_id, kind, attempts, status, last_error
+    ), events AS (
+        INSERT INTO control_plane.tenant_events (tenant_id, event_type, actor, payload)
+        SELECT tenant_id, 'error', :actor,
+               jsonb_build_object('job_id', id, 'kind', kind, 'attempts', attempts, 'error', last_error)
+        FROM reaped
+        WHERE status = 'failed'
+    )
+    SELECT count(*) FROM reaped
+""")
+
+
+async def claim_batch(conn: AsyncConnection, worker_id: str, limit: int, per_host_cap: int) -> List[Dict[str, Any]]:
+    """Reclama hasta `limit` jobs y los marca `running`. Commitea en la misma llamada."""
+    async with conn.begin():
+        chosen: List[str] = []
+        # Tenants/hosts ya vistos en esta transacción (elegidos o descartados): la
+        # siguiente vuelta los excluye y sigue escaneando la cola hasta llenar el lote
+        skip_tenants: Set[str] = set()
+        skip_hosts: Set[str] = set()
+        host_free: Dict[str, int] = {}
+        while len(chosen) < limit:
+            candidates = (
+                await conn.execute(
+                    _CANDIDATES_SQL,
+                    {
+                        "scan": (limit - len(chosen)) * 4,
+                        "per_host_cap": per_host_cap,
+                        "skip_tenants": list(skip_tenants),
+                        "skip_hosts": list(skip_hosts),
+                    },
+                )
+            ).mappings().all()
+            if not candidates:
+                break
+
+            tenant_ids = list({str(c["tenant_id"]) for c in candidates})
+            new_hosts = list({c["db_host"] for c in candidates} - host_free.keys())
+            locked_tenants = {
+                str(t) for t in (
+                    await conn.execute(_LOCK_TENANTS_SQL, {"tenant_ids": tenant_ids, "ns": _LOCK_NS_TENANT})
+                ).scalars()
+            }
+            locked_hosts = set(
+                (await conn.execute(_LOCK_HOSTS_SQL, {"hosts": new_hosts, "ns": _LOCK_NS_HOST})).scalars()
+            )
+            busy = {
+                str(t) for t in (
+                    await conn.execute(_BUSY_TENANTS_SQL, {"tenant_ids": list(locked_tenants)})
+                ).scalars()
+            }
+            for h in new_hosts:
+                # Host bloqueado por el claim de otro worker: 0 libres en esta transacción
+                host_free[h] = per_host_cap if h in locked_hosts else 0
+            for r in (await conn.execute(_RUNNING_PER_HOST_SQL, {"hosts": list(locked_hosts)})).mappings():
+                host_free[r["db_host"]] = per_host_cap - r["n"]
+
+            for c in candidates:
+                tid, host = str(c["tenant_id"]), c["db_host"]
+                skip_tenants.add(tid)
+                if tid not in locked_tenants or tid in busy or host_free[host] <= 0:
+                    if host_free[host] <= 0:
+                        skip_hosts.add(host)
+                    continue
+                if len(chosen) >= limit:
+                    continue
+                chosen.append(str(c["id"]))
+                busy.add(tid)
+                host_free[host] -= 1
+                if host_free[host] <= 0:
+                    skip_hosts.add(host)
+        if not chosen:
+            return []
+        rows = await conn.execute(_MARK_RUNNING_SQL, {"ids": chosen, "worker_id": worker_id})
+        return [dict(r) for r in rows.mappings()]
+
+
+def backoff_s(attempt: int, base_s: float, cap_s: float) -> float:
+    # Exponencial con jitter ("equal jitter"): evita reintentos sincronizados
+    delay = min(cap_s, base_s * 2 ** max(0, attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def mark_succeeded(conn: AsyncConnection, job_id: str, worker_id: str) -> None:
+    async with conn.begin():
+        await conn.execute(_SUCCEED_SQL, {"id": job_id, "worker_id": worker_id})
+
+
+async def mark_failed(
+    conn: AsyncConnection,
+    job: Dict[str, Any],
+    worker_id: str,
+    error: str,
+    base_backoff_s: float,
+    max_backoff_s: float,
+    retry: bool = True,
+) -> bool:
+    """Re-encola con backoff o marca `failed` (+ evento 'error'). Devuelve True si se reintentará."""
+    async with conn.begin():
+        if retry and job["attempts"] < job["max_attempts"]:
+            delay = backoff_s(job["attempts"], base_backoff_s, max_backoff_s)
+            await conn.execute(
+                _RETRY_SQL, {"id": str(job["id"]), "worker_id": worker_id, "error": error, "delay_s": delay}
+            )
+            return True
+        row = (
+            await conn.execute(_FAIL_SQL, {"id": str(job["id"]), "worker_id": worker_id, "error": error})
+        ).mappings().first()
+        if row:
+            await conn.execute(
+                _ERROR_EVENT_SQL,
+                {
+                    "tenant_id": str(row["tenant_id"]),
+                    "actor": f"job-worker:{worker_id}",
+                    "payload": json.dumps(
+                        {"job_id": str(job["id"]), "kind": row["kind"], "attempts": row["attempts"], "error": error}
+                    ),
+                },
+            )
+        return False
+
+
+async def report_progress(
+    conn: AsyncConnection, job_id: str, worker_id: str, progress: int, message: Optional[str] = None
+) -> None:
+    async with conn.begin():
+        await conn.execute(
+            _PROGRESS_SQL,
+            {"id": job_id, "worker_id": worker_id, "progress": max(0, min(100, progress)), "message": message},
+        )
+
+
+async def heartbeat(conn: AsyncConnection, job_ids: List[str], worker_id: str) -> None:
+    if not job_ids:
+        return
+    async with conn.begin():
+        await conn.execute(_HEARTBEAT_SQL, {"ids": job_ids, "worker_id": worker_id})
+
+
+async def reap_expired(conn: AsyncConnection, lease_s: float, worker_id: str) -> int:
+    async with conn.begin():
+        return (await conn.execute(_REAP_SQL, {"lease_s": lease_s, "actor": f"job-worker:{worker_id}"})).scalar_one()
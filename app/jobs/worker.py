@@ -0,0 +1,141 @@
+"""
+Worker de jobs de tenant. Escala horizontalmente: cada proceso reclama lotes con
+SKIP LOCKED, así que agregar procesos agrega throughput sin coordinación externa.
+
+    uv run python -m app.jobs.worker --concurrency 8
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict
+
+from app import db
+from app.jobs import queue
+from app.jobs.handlers import HANDLERS, JobContext, JobError
+
+log = logging.getLogger(__name__)
+
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "8"))
+JOBS_BATCH_SIZE = int(os.getenv("JOBS_BATCH_SIZE", "8"))
+# Tope global (todos los workers) de jobs corriendo contra un mismo db_host
+JOBS_PER_HOST_CAP = int(os.getenv("JOBS_PER_HOST_CAP", "2"))
+JOBS_POLL_INTERVAL_S = float(os.getenv("JOBS_POLL_INTERVAL_S", "1"))
+JOBS_LEASE_S = float(os.getenv("JOBS_LEASE_S", "60"))
+JOBS_BACKOFF_BASE_S = float(os.getenv("JOBS_BACKOFF_BASE_S", "5"))
+JOBS_BACKOFF_MAX_S = float(os.getenv("JOBS_BACKOFF_MAX_S", "600"))
+
+
+class JobWorker:
+    def __init__(
+        self,
+        concurrency: int = JOBS_CONCURRENCY,
+        batch_size: int = JOBS_BATCH_SIZE,
+        per_host_cap: int = JOBS_PER_HOST_CAP,
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.per_host_cap = per_host_cap
+        self.cp_engine = db.get_engine()
+        self.running: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _run_job(self, job: dict) -> None:
+        job_id = str(job["id"])
+        handler = HANDLERS.get(job["kind"])
+        try:
+            if handler is None:
+                raise JobError(f"kind desconocido: {job['kind']}")
+            await handler(JobContext(job=job, worker_id=self.worker_id, cp_engine=self.cp_engine))
+        except Exception as e:
+            retry = not isinstance(e, JobError)
+            log.warning("job %s (%s) falló: %s", job_id, job["kind"], e)
+            async with self.cp_engine.connect() as conn:
+                await queue.mark_failed(
+                    conn, job, self.worker_id, str(e), JOBS_BACKOFF_BASE_S, JOBS_BACKOFF_MAX_S, retry=retry
+                )
+        else:
+            async with self.cp_engine.connect() as conn:
+                await queue.mark_succeeded(conn, job_id, self.worker_id)
+        finally:
+            self.running.pop(job_id, None)
+
+    async def _heartbeat_loop(self) -> None:
+        # Mantiene vivos los leases propios y recupera los de workers caídos. Tras stop()
+        # sigue mientras haya jobs en curso: si no, otro worker los re-encolaría y
+        # correrían dos veces
+        while not self._stopping.is_set() or self.running:
+            try:
+                async with self.cp_engine.connect() as conn:
+                    await queue.heartbeat(conn, list(self.running), self.worker_id)
+                    reaped = await queue.reap_expired(conn, JOBS_LEASE_S, self.worker_id)
+                if reaped:
+                    log.info("jobs: %d leases vencidos re-encolados", reaped)
+            except Exception:
+                log.exception("jobs: heartbeat fallido")
+            await asyncio.sleep(JOBS_LEASE_S / 3)
+
+    async def run(self) -> None:
+        log.info("jobs: worker %s (concurrency=%d)", self.worker_id, self.concurrency)
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                free = self.concurrency - len(self.running)
+                claimed = []
+                if free > 0:
+                    try:
+                        async with self.cp_engine.connect() as conn:
+                            claimed = await queue.claim_batch(
+                                conn, self.worker_id, min(free, self.batch_size), self.per_host_cap
+                            )
+                    except Exception:
+                        # p.ej. carrera contra uq_tenant_jobs_running_tenant: se reintenta en el próximo ciclo
+                        log.exception("jobs: claim fallido")
+                for job in claimed:
+                    self.running[str(job["id"])] = asyncio.create_task(self._run_job(job))
+                # Lote lleno => probablemente hay más trabajo: reclamar sin esperar
+                if claimed and len(claimed) == min(free, self.batch_size):
+                    continue
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), JOBS_POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.running:
+                await asyncio.gather(*self.running.values(), return_exceptions=True)
+            # Recién ahora: el heartbeat cubrió a los jobs en curso hasta que terminaron
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Worker de jobs de tenant")
+    ap.add_argument("--concurrency", type=int, default=JOBS_CONCURRENCY)
+    ap.add_argument("--batch-size", type=int, default=JOBS_BATCH_SIZE)
+    ap.add_argument("--per-host-cap", type=int, default=JOBS_PER_HOST_CAP)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main() -> None:
+        worker = JobWorker(args.concurrency, args.batch_size, args.per_host_cap)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        try:
+            await worker.run()
+        finally:
+            await db.dispose()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,85 @@
-from app import settings
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy import text
-from app.routers.tenants import router as tenants_router
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app import db
+from app.deps.event_types import event_types
+from app.deps.tenant_db import dispose_all_tenant_engines, get_tenant_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Falla al arrancar el worker (no en el primer request) si falta la config;
+    # engines y pools se crean en el primer uso
+    db.control_plane_dsn()
+    yield
+    await event_types.close()
+    await dispose_all_tenant_engines()
+    await db.dispose()
 
 
-from app.deps.tenant_db import get_tenant_engine
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # Checkout del pool excedió pool_timeout: fallar rápido en vez de encolar
+    return JSONResponse(status_code=503, content={"detail": "Database pool exhausted"}, headers={"Retry-After": "1"})
 
-app = FastAPI(title="Control Plane API")
 
-@app.get("/health")
 async def health():
     return {"ok": True}
 
-@app.get("/tenants/ping")
+
 async def ping_tenant(engine: AsyncEngine = Depends(get_tenant_engine)):
     # Ejecuta una consulta trivial en la BD del tenant
     async with engine.connect() as conn:
         await conn.execute(text("SELECT 1"))
     return {"ok": True}
 
-app.include_router(tenants_router)
+
+def create_app() -> FastAPI:
+    """App factory: `uvicorn app.main:create_app --factory`."""
+    # Guardrail de secretos (staging/prod) al crear la app, no al importar el módulo
+    from app import settings  # noqa: F401
+    from app.middleware.deadline import RequestDeadlineMiddleware
+    from app.middleware.tenant import TenantResolverMiddleware
+    from app import profiling
+    from app.routers.event_types import router as event_types_router
+    from app.routers.jobs import router as jobs_router
+    from app.routers.tenants import router as tenants_router
+
+    app = FastAPI(title="Control Plane API", lifespan=lifespan)
+    app.add_middleware(TenantResolverMiddleware)
+    # El último agregado es el más externo: el deadline cubre también la resolución del tenant
+    app.add_middleware(RequestDeadlineMiddleware)
+    if profiling.PROFILING_ENABLED:
+        from app.middleware.profiling import ProfilingMiddleware
+        from app.routers.admin import router as admin_router
+
+        # Deshabilitado no hay middleware ni hooks: costo cero en el hot path
+        profiling.install_sql_hooks()
+        profiling.install_response_hooks()
+        app.add_middleware(ProfilingMiddleware)
+        app.include_router(admin_router)
+    app.add_exception_handler(PoolTimeoutError, pool_timeout_handler)
+
+    app.get("/health")(health)
+    app.get("/tenants/ping")(ping_tenant)
+    app.include_router(tenants_router)
+    app.include_router(jobs_router)
+    app.include_router(event_types_router)
+    return app
+
+
+_app = None
+
+
+def __getattr__(name: str):
+    # Compatibilidad con `uvicorn app.main:app`: se construye recién al pedirla
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Deadline por defecto de cada request (0 = sin deadline)
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "30"))
+# Tope para el header x-request-timeout-ms: el cliente puede acortar, no alargar sin límite
+REQUEST_DEADLINE_MAX_S = float(os.getenv("REQUEST_DEADLINE_MAX_S", "120"))
+
+
+def request_deadline(headers: Headers) -> Optional[float]:
+    """Segundos disponibles para la request: header x-request-timeout-ms (acotado) o el default."""
+    raw = headers.get("x-request-timeout-ms")
+    if raw:
+        try:
+            return min(max(int(raw), 1) / 1000, REQUEST_DEADLINE_MAX_S)
+        except ValueError:
+            pass
+    return REQUEST_DEADLINE_S or None
+
+
+class RequestDeadlineMiddleware:
+    """
+    Middleware ASGI puro: corre el handler en su propia task y la cancela si el
+    cliente se desconecta o vence el deadline. Al cancelar, psycopg cancela la
+    query en el servidor y la conexión vuelve al pool en vez de quedar ocupada
+    hasta que termine (statement_timeout queda como red de seguridad).
+
+    Si el deadline vence antes de empezar la respuesta se devuelve 504. Una vez
+    enviada la respuesta completa no se cancela nada (BackgroundTasks siguen).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline_s = request_deadline(Headers(scope=scope))
+        inbox: asyncio.Queue = asyncio.Queue()
+        disconnected = asyncio.Event()
+        started = finished = False
+
+        async def pump() -> None:
+            # Lee del servidor por adelantado para enterarse del http.disconnect
+            # aunque el handler no esté llamando a receive()
+            while True:
+                message = await receive()
+                inbox.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        app_task = asyncio.create_task(self.app(scope, inbox.get, send_wrapper))
+        pump_task = asyncio.create_task(pump())
+        disconnect_task = asyncio.create_task(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {app_task, disconnect_task}, timeout=deadline_s, return_when=asyncio.FIRST_COMPLETED
+            )
+            if app_task in done or finished:
+                await app_task
+                return
+
+            app_task.cancel()
+            await asyncio.gather(app_task, return_exceptions=True)
+            if not disconnected.is_set() and not started:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 504,
+                        "headers": [(b"content-type", b"application/json")],
+                    }
+                )
+                await send({"type": "http.response.body", "body": b'{"detail":"Request deadline exceeded"}'})
+        finally:
+            if not app_task.done():
+                app_task.cancel()
+            pump_task.cancel()
+            disconnect_task.cancel()
@@ -0,0 +1,58 @@
+import random
+import time
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import profiling
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI puro (sólo se registra con PROFILING_ENABLED=1): elige la
+    request por header (`X-Profile: 1`) o por muestreo, deja un `RequestProfile`
+    en el ContextVar para `profiling.phase()` y los hooks SQL, y al terminar lo
+    guarda en `profiling.store`. Debe ser el más externo para cubrir los demás.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = profiling.PROFILING_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/admin/profiles"):
+            await self.app(scope, receive, send)
+            return
+        if Headers(scope=scope).get(profiling.PROFILING_HEADER) == "1":
+            trigger = "header"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            trigger = "sample"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        prof = profiling.RequestProfile(scope["method"], scope["path"], trigger)
+        token = profiling.activate(prof)
+        status = None
+        # Desde que el handler empieza a responder hasta el último chunk (render + envío)
+        response_start = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_start
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_start = time.perf_counter()
+                prof.add("app", prof.t0, response_start)
+                if trigger == "header":
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-id", prof.id.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                if response_start is not None:
+                    prof.add("send", response_start, time.perf_counter())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiling.deactivate(token)
+            prof.finish(status)
+            profiling.store.record(prof)
@@ -0,0 +1,27 @@
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.deps.tenant_db import LazyTenant, host_matcher, slug_from_headers
+
+
+class TenantResolverMiddleware:
+    """
+    Middleware ASGI puro: extrae el slug una sola vez por request (header
+    x-tenant-slug o host vía `host_matcher`) y deja un `LazyTenant` en
+    `request.state.tenant`. No hace I/O: `get_tenant_engine` lo resuelve recién
+    cuando un endpoint pide el tenant, así /health, /tenants, /jobs... no pagan
+    la consulta al control plane.
+
+    Por host sólo se extrae con TENANT_BASE_DOMAINS/TENANT_CUSTOM_DOMAINS
+    configurados; si no, el host legacy (primer label) queda para la dependency.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            slug = slug_from_headers(Headers(scope=scope), use_host=host_matcher.configured)
+            if slug:
+                scope.setdefault("state", {})["tenant"] = LazyTenant(slug)
+        await self.app(scope, receive, send)
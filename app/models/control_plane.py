@@ -2,11 +2,13 @@ from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     CheckConstraint,
     ForeignKey,
     Integer,
     JSON,
+    SmallInteger,
     String,
     Text,
     text,
@@ -38,7 +40,7 @@ class Tenant(Base):
             "app_version IS NULL OR app_version ~ '^\\d+\\.\\d+\\.\\d+(-[0-9A-Za-z\\.-]+)?(\\+[0-9A-Za-z\\.-]+)?$'",
             name="tenants_app_version_semver_chk",
         ),
-        CheckConstraint("status IN ('provisioning','active','suspended','deleting')", name="tenants_status_chk"),
+        CheckConstraint("status IN ('provisioning','active','suspended','deleting','deleted')", name="tenants_status_chk"),
         CheckConstraint("slug ~ '^[a-z0-9]([-a-z0-9]*[a-z0-9])?$'", name="tenants_slug_format_chk"),
         CheckConstraint("length(display_name) > 0", name="tenants_display_name_not_empty"),
         CheckConstraint("length(db_name) > 0", name="tenants_db_name_not_empty"),
@@ -106,6 +108,11 @@ class TenantLimit(Base):
         CheckConstraint("max_db_size_mb IS NULL OR max_db_size_mb >= 0", name="limits_dbsize_nonneg"),
         CheckConstraint("max_users IS NULL OR max_users >= 0", name="limits_users_nonneg"),
         CheckConstraint("max_attachments_gb IS NULL OR max_attachments_gb >= 0", name="limits_attach_nonneg"),
+        CheckConstraint("max_concurrent_requests IS NULL OR max_concurrent_requests > 0", name="limits_concurrency_pos"),
+        CheckConstraint("rate_limit_per_s IS NULL OR rate_limit_per_s > 0", name="limits_rate_pos"),
+        CheckConstraint("rate_limit_burst IS NULL OR rate_limit_burst > 0", name="limits_burst_pos"),
+        CheckConstraint("statement_timeout_ms IS NULL OR statement_timeout_ms > 0", name="limits_stmt_timeout_pos"),
+        CheckConstraint("idle_in_tx_timeout_ms IS NULL OR idle_in_tx_timeout_ms > 0", name="limits_idle_tx_timeout_pos"),
         {"schema": "control_plane"},
     )
 
@@ -117,7 +124,90 @@ class TenantLimit(Base):
     max_db_size_mb: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     max_users: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     max_attachments_gb: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Admisión en el request path del tenant (NULL => default del billing_plan)
+    max_concurrent_requests: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    rate_limit_per_s: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    rate_limit_burst: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Timeouts de sesión en la BD del tenant (NULL => default del billing_plan)
+    statement_timeout_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    idle_in_tx_timeout_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
 
     tenant: Mapped["Tenant"] = relationship(back_populates="limits")
+
+
+# ==== Tenant Usage (rollups hora/día) ====
+class TenantUsageRollup(Base):
+    __tablename__ = "tenant_usage_rollups"
+    __table_args__ = (
+        CheckConstraint("granularity IN ('hour','day')", name="usage_granularity_chk"),
+        {"schema": "control_plane"},
+    )
+
+    tenant_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=False),
+        ForeignKey("control_plane.tenants.id", ondelete="CASCADE", deferrable=True, initially="DEFERRED"),
+        primary_key=True,
+    )
+    granularity: Mapped[str] = mapped_column(Text, primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    # Máximo observado dentro del bucket
+    db_size_bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    users_count: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    attachments_bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    last_sampled_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+
+
+
+# ==== Fleet counters (mantenidos por trigger, ver app/fleet) ====
+class TenantFleetCounter(Base):
+    __tablename__ = "tenant_fleet_counters"
+    __table_args__ = (
+        CheckConstraint(
+            "dimension IN ('status','schema_version','app_version','billing_plan','db_host')",
+            name="fleet_dimension_chk",
+        ),
+        {"schema": "control_plane"},
+    )
+
+    dimension: Mapped[str] = mapped_column(Text, primary_key=True)
+    # '' representa NULL en la columna de origen
+    value: Mapped[str] = mapped_column(Text, primary_key=True)
+    n: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=text("0"))
+
+
+# ==== Tenant Jobs (cola durable, ver app/jobs) ====
+class TenantJob(Base):
+    __tablename__ = "tenant_jobs"
+    __table_args__ = (
+        CheckConstraint("kind IN ('provision','finalize_delete','migrate')", name="jobs_kind_chk"),
+        CheckConstraint("status IN ('queued','running','succeeded','failed')", name="jobs_status_chk"),
+        CheckConstraint("progress BETWEEN 0 AND 100", name="jobs_progress_range_chk"),
+        CheckConstraint("max_attempts > 0", name="jobs_max_attempts_pos"),
+        {"schema": "control_plane"},
+    )
+
+    id: Mapped[str] = mapped_column(UUID(as_uuid=False), primary_key=True, server_default=text("gen_random_uuid()"))
+    tenant_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=False),
+        ForeignKey("control_plane.tenants.id", ondelete="CASCADE", deferrable=True, initially="DEFERRED"),
+        nullable=False,
+    )
+    kind: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(Text, nullable=False, server_default=text("'queued'"))
+    db_host: Mapped[str] = mapped_column(Text, nullable=False)
+    payload: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    progress: Mapped[int] = mapped_column(SmallInteger, nullable=False, server_default=text("0"))
+    progress_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("5"))
+    run_after: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    locked_by: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
@@ -0,0 +1,240 @@
+"""
+Profiling opt-in por request (PROFILING_ENABLED=1).
+
+Una request perfilada lleva un `RequestProfile` en un ContextVar; el código
+marca fases con `phase("nombre")` y los hooks de SQLAlchemy agregan cada
+sentencia SQL y la espera de pool. Deshabilitado, `phase()` cuesta un
+`ContextVar.get()` y no hay middleware ni hooks instalados.
+
+Las requests se eligen por muestreo (PROFILING_SAMPLE_RATE) o con el header
+`X-Profile: 1`. Se guardan las PROFILING_SLOWEST_N más lentas de la ventana
+PROFILING_WINDOW_S y las últimas pedidas por header; ver /admin/profiles.
+"""
+
+import heapq
+import itertools
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_HEADER = os.getenv("PROFILING_HEADER", "x-profile").lower()
+PROFILING_SLOWEST_N = int(os.getenv("PROFILING_SLOWEST_N", "50"))
+PROFILING_WINDOW_S = float(os.getenv("PROFILING_WINDOW_S", "3600"))
+# Tope de eventos por request (p.ej. N+1 con miles de queries)
+PROFILING_MAX_EVENTS = int(os.getenv("PROFILING_MAX_EVENTS", "500"))
+_SQL_MAX_CHARS = 500
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_NOOP = nullcontext()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.status: Optional[int] = None
+        self.duration_ms = 0.0
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def add(self, name: str, start: float, end: float, detail: Optional[Dict[str, Any]] = None) -> None:
+        if len(self.events) >= PROFILING_MAX_EVENTS:
+            self.dropped += 1
+            return
+        event = {
+            "phase": name,
+            "start_ms": round((start - self.t0) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        if detail:
+            event.update(detail)
+        self.events.append(event)
+
+    @contextmanager
+    def phase(self, name: str, detail: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter(), detail)
+
+    def finish(self, status: Optional[int]) -> None:
+        self.status = status
+        self.duration_ms = round((time.perf_counter() - self.t0) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "events": self.events,
+            "dropped_events": self.dropped,
+        }
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def activate(prof: RequestProfile) -> Token:
+    return _current.set(prof)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+def phase(name: str, **detail: Any):
+    """Marca una fase del request perfilado en curso; no-op si no hay profiling."""
+    prof = _current.get()
+    if prof is None:
+        return _NOOP
+    return prof.phase(name, detail or None)
+
+
+class ProfileStore:
+    """Las N requests más lentas de la ventana (min-heap) + las últimas pedidas por header."""
+
+    def __init__(self, slowest_n: int = PROFILING_SLOWEST_N, window_s: float = PROFILING_WINDOW_S):
+        self.slowest_n = slowest_n
+        self.window_s = window_s
+        self._heap: List[Tuple[float, int, RequestProfile]] = []
+        self._seq = itertools.count()
+        self.recent: Deque[RequestProfile] = deque(maxlen=slowest_n)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.window_s
+        if any(p.started_at < cutoff for _, _, p in self._heap):
+            self._heap = [e for e in self._heap if e[2].started_at >= cutoff]
+            heapq.heapify(self._heap)
+
+    def record(self, prof: RequestProfile) -> None:
+        if prof.trigger == "header":
+            self.recent.append(prof)
+        self._expire()
+        entry = (prof.duration_ms, next(self._seq), prof)
+        if len(self._heap) < self.slowest_n:
+            heapq.heappush(self._heap, entry)
+        elif prof.duration_ms > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def slowest(self) -> List[RequestProfile]:
+        self._expire()
+        return [p for _, _, p in sorted(self._heap, key=lambda e: e[0], reverse=True)]
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        for prof in itertools.chain(self.recent, (e[2] for e in self._heap)):
+            if prof.id == profile_id:
+                return prof
+        return None
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self.recent.clear()
+
+
+store = ProfileStore()
+
+_hooks_installed = False
+
+
+def install_sql_hooks() -> None:
+    """Hooks globales de SQLAlchemy (todas las engines); sólo se instalan con profiling habilitado."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.pool import Pool
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("_profile_t0", []).append(time.perf_counter())
+
+    def _record(conn, statement: str, executemany: bool, error: Optional[str] = None) -> None:
+        prof = _current.get()
+        stack = conn.info.get("_profile_t0")
+        if prof is None or not stack:
+            return
+        start = stack.pop()
+        detail: Dict[str, Any] = {"sql": " ".join(statement.split())[:_SQL_MAX_CHARS]}
+        if executemany:
+            detail["executemany"] = True
+        if error:
+            detail["error"] = error
+        prof.add("sql", start, time.perf_counter(), detail)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _record(conn, statement, executemany)
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(ctx):
+        if ctx.connection is not None and ctx.statement:
+            _record(ctx.connection, ctx.statement, False, type(ctx.original_exception).__name__)
+
+    # Espera de checkout (incluye abrir una conexión nueva si hace falta). No hay
+    # evento "antes del checkout": se envuelve Pool.connect, sólo con profiling habilitado.
+    original_connect = Pool.connect
+
+    def _timed_connect(self):
+        prof = _current.get()
+        if prof is None:
+            return original_connect(self)
+        with prof.phase("pool_wait"):
+            return original_connect(self)
+
+    Pool.connect = _timed_connect
+    _hooks_installed = True
+
+
+_response_hooks_installed = False
+
+
+def install_response_hooks() -> None:
+    """Fase "serialization" en todas las rutas; sólo se instala con profiling habilitado."""
+    global _response_hooks_installed
+    if _response_hooks_installed:
+        return
+    from fastapi import routing
+    from fastapi.responses import JSONResponse
+
+    # El handler de cada APIRoute resuelve `serialize_response` (validación contra el
+    # response_model + jsonable_encoder) del módulo en cada request: se envuelve ahí
+    original_serialize = routing.serialize_response
+
+    async def _timed_serialize(*args, **kwargs):
+        prof = _current.get()
+        if prof is None:
+            return await original_serialize(*args, **kwargs)
+        with prof.phase("serialization", {"step": "validate"}):
+            return await original_serialize(*args, **kwargs)
+
+    # json.dumps del contenido ya codificado (JSONResponse renderiza en el constructor)
+    original_render = JSONResponse.render
+
+    def _timed_render(self, content):
+        prof = _current.get()
+        if prof is None:
+            return original_render(self, content)
+        with prof.phase("serialization", {"step": "render"}):
+            return original_render(self, content)
+
+    routing.serialize_response = _timed_serialize
+    JSONResponse.render = _timed_render
+    _response_hooks_installed = True
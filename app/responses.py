@@ -0,0 +1,37 @@
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import Response
+from sqlalchemy.engine import Result
+
+from app.profiling import phase
+
+try:
+    import orjson
+except ImportError:  # p.ej. imagen construida con un uv.lock sin orjson: se pierde sólo la velocidad
+    orjson = None
+
+
+class ORJSONRowsResponse(Response):
+    """
+    Respuesta JSON para listados grandes leídos como mappings desde la BD.
+
+    Serializa las filas directamente a bytes con orjson, sin construir ni
+    re-validar un modelo Pydantic por fila. Solo para salida confiable de la BD:
+    las columnas seleccionadas deben coincidir con el `response_model` del endpoint.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # RowMapping no es serializable nativamente: `default=dict` lo convierte por fila.
+        # OPT_UTC_Z emite "Z" para UTC, igual que Pydantic, para no cambiar el contrato.
+        with phase("serialization", rows=len(content)):
+            if orjson is None:
+                # Mismo formato que Pydantic (UTC con "Z"), más lento
+                return pydantic_core.to_json([dict(r) for r in content])
+            return orjson.dumps(content, default=dict, option=orjson.OPT_UTC_Z)
+
+
+def rows_response(result: Result) -> ORJSONRowsResponse:
+    return ORJSONRowsResponse(content=result.mappings().all())
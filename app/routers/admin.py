@@ -0,0 +1,53 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from app import profiling
+from app.settings import ENVIRONMENT
+
+# Si está definida, /admin/* exige el header X-Admin-Token
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+
+# Guardrail: en staging/prod /admin/profiles (SQL, paths, timings) no se expone sin token
+if ENVIRONMENT in {"staging", "prod"} and not PROFILING_ADMIN_TOKEN:
+    raise RuntimeError(f"PROFILING_ENABLED=1 en {ENVIRONMENT} requiere PROFILING_ADMIN_TOKEN")
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if PROFILING_ADMIN_TOKEN and not hmac.compare_digest(x_admin_token or "", PROFILING_ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de admin inválido")
+
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+def _summary(prof: profiling.RequestProfile) -> dict:
+    out = prof.to_dict()
+    events = out.pop("events")
+    out["sql_count"] = sum(1 for e in events if e["phase"] == "sql")
+    out["sql_ms"] = round(sum(e["duration_ms"] for e in events if e["phase"] == "sql"), 3)
+    return out
+
+
+@router.get("")
+async def list_profiles():
+    # Resumen (sin timeline); el detalle completo en /admin/profiles/{id}
+    return {
+        "slowest": [_summary(p) for p in profiling.store.slowest()],
+        "recent": [_summary(p) for p in reversed(profiling.store.recent)],
+    }
+
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str):
+    prof = profiling.store.get(profile_id)
+    if prof is None:
+        raise HTTPException(status_code=404, detail="Profile no encontrado")
+    return prof.to_dict()
+
+
+@router.delete("", status_code=204)
+async def clear_profiles():
+    profiling.store.clear()
@@ -0,0 +1,15 @@
+from typing import List
+
+from fastapi import APIRouter
+
+from app.deps.event_types import event_types
+from app.schemas.control_plane import EventTypeOut
+
+router = APIRouter(prefix="/event-types", tags=["event-types"])
+
+
+@router.get("", response_model=List[EventTypeOut])
+async def list_event_types():
+    # Desde el cache en proceso (invalidado por NOTIFY); no consulta la BD por request
+    catalog = await event_types.catalog()
+    return [{"code": code, "description": desc} for code, desc in catalog.items()]
@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_read_session, get_session
+from app.models.control_plane import Tenant, TenantJob
+from app.schemas.control_plane import TenantJobCreate, TenantJobOut
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.post("/tenants/{tenant_id}/jobs", response_model=TenantJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_job(tenant_id: str, payload: TenantJobCreate, session: AsyncSession = Depends(get_session)):
+    tenant = await session.get(Tenant, tenant_id)
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant no encontrado")
+    if payload.kind == "finalize_delete":
+        # Re-encolar la finalización sólo tiene sentido mientras el borrado está en curso
+        if tenant.status != "deleting":
+            raise HTTPException(status_code=409, detail=f"Tenant status={tenant.status}; se esperaba deleting")
+    elif tenant.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Tenant no encontrado")
+    job = TenantJob(tenant_id=tenant_id, kind=payload.kind, db_host=tenant.db_host, payload=payload.payload)
+    if payload.max_attempts is not None:
+        job.max_attempts = payload.max_attempts
+    session.add(job)
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if "uq_tenant_jobs_active_kind" in str(e.orig):
+            raise HTTPException(status_code=409, detail=f"Ya hay un job {payload.kind} pendiente para el tenant")
+        raise
+    await session.refresh(job)
+    return job
+
+
+@router.get("/tenants/{tenant_id}/jobs", response_model=List[TenantJobOut])
+async def list_jobs(
+    tenant_id: str,
+    status_eq: Optional[str] = Query(default=None, pattern="^(queued|running|succeeded|failed)$"),
+    limit: int = Query(default=50, ge=1, le=500),
+    session: AsyncSession = Depends(get_read_session),
+):
+    stmt = select(TenantJob).where(TenantJob.tenant_id == tenant_id)
+    if status_eq:
+        stmt = stmt.where(TenantJob.status == status_eq)
+    stmt = stmt.order_by(TenantJob.created_at.desc()).limit(limit)
+    res = await session.execute(stmt)
+    return res.scalars().all()
+
+
+@router.get("/jobs/{job_id}", response_model=TenantJobOut)
+async def get_job(job_id: str, session: AsyncSession = Depends(get_read_session)):
+    # Progreso en vivo: el cliente puede pedir X-Max-Staleness: 0 para leer del primario
+    obj = await session.get(TenantJob, job_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return obj
@@ -1,33 +1,48 @@
+import uuid
 from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import select, update
+from sqlalchemy import insert, select, text, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_session
-from app.models.control_plane import Tenant, TenantEvent, TenantLimit
+from app.db import get_read_session, get_session
+from app.deps.event_types import event_types
+from app.fleet.counters import FLEET_DIMENSIONS
+from app.models.control_plane import Tenant, TenantEvent, TenantJob, TenantLimit, TenantUsageRollup
+from app.responses import rows_response
 from app.schemas.control_plane import (
     TenantCreate,
     TenantOut,
     TenantUpdate,
+    TenantEventBatchCreate,
     TenantEventCreate,
     TenantEventOut,
     TenantLimitUpsert,
     TenantLimitOut,
+    TenantOverLimitOut,
+    TenantStatsOut,
+    TenantUsageOut,
 )
 
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 
+# Columnas de salida para el fast path (mismas que los modelos *Out)
+_TENANT_OUT_COLS = [Tenant.__table__.c[name] for name in TenantOut.model_fields]
+_EVENT_OUT_COLS = [TenantEvent.__table__.c[name] for name in TenantEventOut.model_fields]
+_FAST_DESC = "Serializa filas directo a JSON (orjson) sin validar por fila; para listados grandes"
+
 
 @router.get("", response_model=List[TenantOut])
 async def list_tenants(
     q: Optional[str] = Query(default=None, description="Filtro por slug/display_name (ILIKE %q%)"),
     status_eq: Optional[str] = Query(default=None, pattern="^(provisioning|active|suspended|deleting)$"),
-    session: AsyncSession = Depends(get_session),
+    fast: bool = Query(default=False, description=_FAST_DESC),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    stmt = select(Tenant).where(Tenant.deleted_at.is_(None))
+    stmt = select(*_TENANT_OUT_COLS) if fast else select(Tenant)
+    stmt = stmt.where(Tenant.deleted_at.is_(None))
     if q:
         like = f"%{q}%"
         stmt = stmt.where((Tenant.slug.ilike(like)) | (Tenant.display_name.ilike(like)))
@@ -35,9 +50,31 @@ async def list_tenants(
         stmt = stmt.where(Tenant.status == status_eq)
     stmt = stmt.order_by(Tenant.updated_at.desc())
     res = await session.execute(stmt)
+    if fast:
+        return rows_response(res)
     return res.scalars().all()
 
 
+# O(grupos): tabla mantenida por trg_tenants_fleet_counters, sin GROUP BY sobre tenants
+_STATS_SQL = text("""
+    SELECT dimension, NULLIF(value, '') AS value, n
+    FROM control_plane.tenant_fleet_counters
+    WHERE n > 0
+    ORDER BY dimension, n DESC, value
+""")
+
+
+# Antes de /{tenant_id}: si no, "stats" se tomaría como id
+@router.get("/stats", response_model=TenantStatsOut)
+async def tenant_stats(session: AsyncSession = Depends(get_read_session)):
+    out = {d: [] for d in FLEET_DIMENSIONS}
+    for r in await session.execute(_STATS_SQL):
+        out[r.dimension].append({"value": r.value, "count": r.n})
+    # Cada tenant vivo aparece exactamente una vez por dimensión
+    out["total"] = sum(g["count"] for g in out["status"])
+    return out
+
+
 @router.post("", response_model=TenantOut, status_code=status.HTTP_201_CREATED)
 async def create_tenant(payload: TenantCreate, session: AsyncSession = Depends(get_session)):
     tenant = Tenant(**payload.model_dump())
@@ -57,7 +94,7 @@ async def create_tenant(payload: TenantCreate, session: AsyncSession = Depends(g
 
 
 @router.get("/{tenant_id}", response_model=TenantOut)
-async def get_tenant(tenant_id: str, session: AsyncSession = Depends(get_session)):
+async def get_tenant(tenant_id: str, session: AsyncSession = Depends(get_read_session)):
     obj = await session.get(Tenant, tenant_id)
     if not obj or obj.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Tenant no encontrado")
@@ -93,6 +130,8 @@ async def soft_delete_tenant(tenant_id: str, session: AsyncSession = Depends(get
         return
     obj.deleted_at = datetime.utcnow()
     obj.status = "deleting"
+    # Finalización (BD del tenant + evento 'deleted') en background, misma transacción
+    session.add(TenantJob(tenant_id=obj.id, kind="finalize_delete", db_host=obj.db_host))
     await session.commit()
 
 
@@ -100,6 +139,8 @@ async def soft_delete_tenant(tenant_id: str, session: AsyncSession = Depends(get
 
 @router.post("/{tenant_id}/events", response_model=TenantEventOut, status_code=201)
 async def add_event(tenant_id: str, payload: TenantEventCreate, session: AsyncSession = Depends(get_session)):
+    # Valida contra el catálogo en memoria: el FK diferido fallaría recién al commit
+    await event_types.validate([payload.event_type])
     # forzamos tenant_id del path
     event = TenantEvent(
         tenant_id=tenant_id,
@@ -113,15 +154,49 @@ async def add_event(tenant_id: str, payload: TenantEventCreate, session: AsyncSe
     return event
 
 
+@router.post("/{tenant_id}/events/batch", response_model=List[TenantEventOut], status_code=201)
+async def add_events_batch(
+    tenant_id: str, payload: TenantEventBatchCreate, session: AsyncSession = Depends(get_session)
+):
+    # Todo o nada: filas con event_type inválido se rechazan antes de cualquier query
+    unknown = set(await event_types.unknown(e.event_type for e in payload.events))
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=[
+                {"index": i, "event_type": e.event_type, "msg": "event_type desconocido"}
+                for i, e in enumerate(payload.events)
+                if e.event_type in unknown
+            ],
+        )
+    if await session.get(Tenant, tenant_id) is None:
+        raise HTTPException(status_code=404, detail="Tenant no encontrado")
+
+    # INSERT multi-fila (insertmanyvalues) con RETURNING en el orden del payload; ids
+    # generados acá para que SQLAlchemy correlacione filas sin caer a un INSERT por fila
+    stmt = insert(TenantEvent).returning(*_EVENT_OUT_COLS, sort_by_parameter_order=True)
+    params = [{"id": str(uuid.uuid4()), "tenant_id": tenant_id, **e.model_dump()} for e in payload.events]
+    rows = (await session.execute(stmt, params)).mappings().all()
+    await session.commit()
+    return rows
+
+
 @router.get("/{tenant_id}/events", response_model=List[TenantEventOut])
-async def list_events(tenant_id: str, session: AsyncSession = Depends(get_session), limit: int = 100):
+async def list_events(
+    tenant_id: str,
+    session: AsyncSession = Depends(get_read_session),
+    limit: int = 100,
+    fast: bool = Query(default=False, description=_FAST_DESC),
+):
     stmt = (
-        select(TenantEvent)
+        (select(*_EVENT_OUT_COLS) if fast else select(TenantEvent))
         .where(TenantEvent.tenant_id == tenant_id)
         .order_by(TenantEvent.created_at.desc())
         .limit(limit)
     )
     res = await session.execute(stmt)
+    if fast:
+        return rows_response(res)
     return res.scalars().all()
 
 
@@ -140,3 +215,62 @@ async def upsert_limits(tenant_id: str, payload: TenantLimitUpsert, session: Asy
     await session.commit()
     obj = await session.get(TenantLimit, tenant_id)
     return obj
+
+
+# ---- Usage (sólo rollups; no toca BDs de tenant) ----
+
+# Último bucket horario por tenant con límites: un index seek por tenant (PK)
+_OVER_LIMIT_SQL = text("""
+    SELECT t.id::text AS tenant_id, t.slug, u.last_sampled_at,
+           EXTRACT(EPOCH FROM now() - u.last_sampled_at)::float8 AS sample_age_s,
+           u.db_size_bytes, u.users_count, u.attachments_bytes,
+           l.max_db_size_mb, l.max_users, l.max_attachments_gb,
+           array_remove(ARRAY[
+             CASE WHEN u.db_size_bytes > l.max_db_size_mb::bigint * 1024 * 1024 THEN 'db_size' END,
+             CASE WHEN u.users_count > l.max_users THEN 'users' END,
+             CASE WHEN u.attachments_bytes > l.max_attachments_gb::bigint * 1024 * 1024 * 1024 THEN 'attachments' END
+           ], NULL) AS over
+    FROM control_plane.tenant_limits l
+    JOIN control_plane.tenants t ON t.id = l.tenant_id AND t.deleted_at IS NULL
+    JOIN LATERAL (
+      SELECT r.last_sampled_at, r.db_size_bytes, r.users_count, r.attachments_bytes
+      FROM control_plane.tenant_usage_rollups r
+      WHERE r.tenant_id = l.tenant_id AND r.granularity = 'hour'
+      ORDER BY r.bucket_start DESC
+      LIMIT 1
+    ) u ON true
+    -- Tenants que el collector dejó de muestrear (suspendidos, fallos) no se reportan con datos viejos
+    WHERE u.last_sampled_at > now() - make_interval(secs => :max_sample_age_s)
+      AND (u.db_size_bytes > l.max_db_size_mb::bigint * 1024 * 1024
+           OR u.users_count > l.max_users
+           OR u.attachments_bytes > l.max_attachments_gb::bigint * 1024 * 1024 * 1024)
+    ORDER BY t.slug
+""")
+
+
+@router.get("/usage/over-limit", response_model=List[TenantOverLimitOut])
+async def list_over_limit(
+    max_sample_age_s: float = Query(default=7200, gt=0, description="Ignora tenants sin muestra más reciente"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    res = await session.execute(_OVER_LIMIT_SQL, {"max_sample_age_s": max_sample_age_s})
+    return res.mappings().all()
+
+
+@router.get("/{tenant_id}/usage", response_model=List[TenantUsageOut])
+async def get_usage(
+    tenant_id: str,
+    granularity: str = Query(default="hour", pattern="^(hour|day)$"),
+    since: Optional[datetime] = Query(default=None, description="Desde bucket_start (inclusive)"),
+    limit: int = Query(default=168, ge=1, le=5000),
+    session: AsyncSession = Depends(get_read_session),
+):
+    stmt = select(TenantUsageRollup).where(
+        TenantUsageRollup.tenant_id == tenant_id,
+        TenantUsageRollup.granularity == granularity,
+    )
+    if since:
+        stmt = stmt.where(TenantUsageRollup.bucket_start >= since)
+    stmt = stmt.order_by(TenantUsageRollup.bucket_start.desc()).limit(limit)
+    res = await session.execute(stmt)
+    return res.scalars().all()
@@ -1,6 +1,7 @@
+import re
 from datetime import datetime
-from typing import Optional, Any
-from pydantic import BaseModel, Field, EmailStr, constr
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field, EmailStr, constr, model_validator
 
 SlugStr = constr(pattern=r"^[a-z0-9]([-a-z0-9]*[a-z0-9])?$")
 AlembicRev = constr(pattern=r"^[0-9a-f]{12}$")
@@ -66,6 +67,17 @@ class TenantEventCreate(BaseModel):
     actor: str
     payload: Optional[dict] = None
 
+# Tope de filas por request en POST /tenants/{id}/events/batch
+EVENTS_BATCH_MAX = 1000
+
+class TenantEventItem(BaseModel):
+    event_type: str
+    actor: str
+    payload: Optional[dict] = None
+
+class TenantEventBatchCreate(BaseModel):
+    events: List[TenantEventItem] = Field(min_length=1, max_length=EVENTS_BATCH_MAX)
+
 class TenantEventOut(BaseModel):
     id: str
     tenant_id: str
@@ -75,12 +87,21 @@ class TenantEventOut(BaseModel):
     created_at: datetime
     model_config = {"from_attributes": True}
 
+class EventTypeOut(BaseModel):
+    code: str
+    description: str
+
 # ==== Limits ====
 
 class TenantLimitUpsert(BaseModel):
     max_db_size_mb: Optional[int] = None
     max_users: Optional[int] = None
     max_attachments_gb: Optional[int] = None
+    max_concurrent_requests: Optional[int] = Field(default=None, gt=0)
+    rate_limit_per_s: Optional[int] = Field(default=None, gt=0)
+    rate_limit_burst: Optional[int] = Field(default=None, gt=0)
+    statement_timeout_ms: Optional[int] = Field(default=None, gt=0)
+    idle_in_tx_timeout_ms: Optional[int] = Field(default=None, gt=0)
     notes: Optional[str] = None
 
 class TenantLimitOut(BaseModel):
@@ -88,6 +109,88 @@ class TenantLimitOut(BaseModel):
     max_db_size_mb: Optional[int] = None
     max_users: Optional[int] = None
     max_attachments_gb: Optional[int] = None
+    max_concurrent_requests: Optional[int] = None
+    rate_limit_per_s: Optional[int] = None
+    rate_limit_burst: Optional[int] = None
+    statement_timeout_ms: Optional[int] = None
+    idle_in_tx_timeout_ms: Optional[int] = None
     notes: Optional[str] = None
     updated_at: datetime
     model_config = {"from_attributes": True}
+
+
+# ==== Usage ====
+
+class TenantUsageOut(BaseModel):
+    tenant_id: str
+    granularity: str
+    bucket_start: datetime
+    samples: int
+    db_size_bytes: Optional[int] = None
+    users_count: Optional[int] = None
+    attachments_bytes: Optional[int] = None
+    last_sampled_at: datetime
+    model_config = {"from_attributes": True}
+
+class TenantOverLimitOut(BaseModel):
+    tenant_id: str
+    slug: str
+    last_sampled_at: datetime
+    sample_age_s: float
+    db_size_bytes: Optional[int] = None
+    users_count: Optional[int] = None
+    attachments_bytes: Optional[int] = None
+    max_db_size_mb: Optional[int] = None
+    max_users: Optional[int] = None
+    max_attachments_gb: Optional[int] = None
+    over: List[str]
+
+
+# ==== Fleet stats ====
+
+class FleetGroupOut(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class TenantStatsOut(BaseModel):
+    total: int
+    status: List[FleetGroupOut] = []
+    schema_version: List[FleetGroupOut] = []
+    app_version: List[FleetGroupOut] = []
+    billing_plan: List[FleetGroupOut] = []
+    db_host: List[FleetGroupOut] = []
+
+
+# ==== Jobs ====
+
+class TenantJobCreate(BaseModel):
+    kind: str = Field(pattern=r"^(provision|finalize_delete|migrate)$")
+    payload: Optional[dict] = None
+    max_attempts: Optional[int] = Field(default=None, ge=1, le=20)
+
+    @model_validator(mode="after")
+    def _check_migrate_target(self):
+        # payload.to termina en el comando de migración y en tenants.schema_version
+        if self.kind == "migrate":
+            to = (self.payload or {}).get("to")
+            if not isinstance(to, str) or not re.fullmatch(r"[0-9a-f]{12}", to):
+                raise ValueError("payload.to debe ser una revisión de Alembic (12 hex)")
+        return self
+
+class TenantJobOut(BaseModel):
+    id: str
+    tenant_id: str
+    kind: str
+    status: str
+    payload: Optional[Any] = None
+    progress: int
+    progress_message: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    locked_by: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+    model_config = {"from_attributes": True}
@@ -38,7 +38,8 @@ class SecretManager:
         if self.backend == "mock":
             return "<REPLACE_ME_DB_PASSWORD>"
 
-        # Placeholders para backends reales
+        # Placeholders para backends reales. Los SDKs se importan dentro de cada rama
+        # (nunca a nivel de módulo): no deben pesar en el arranque de cada worker
         if self.backend == "vault":
             # TODO: implementar con hvac (u otro), usando self.endpoint + secret_ref
             raise NotImplementedError("Vault backend aún no implementado.")
@@ -0,0 +1,357 @@
+"""
+Snapshot del estado del control plane (DR drills, copias a staging).
+
+Exporta `event_types`, `tenants`, `tenant_limits` y `tenant_events` con
+`COPY ... TO STDOUT (FORMAT binary)` a archivos gzip (un chunk por mes de
+`tenant_events`) más un `manifest.json` con la revisión de Alembic, columnas y
+conteos. Memoria constante: los bloques de COPY se comprimen y escriben al vuelo.
+
+Export en paralelo con un snapshot MVCC compartido (`pg_export_snapshot`): todos
+los chunks ven el mismo estado. Restore en paralelo con `COPY ... FROM STDIN`
+sobre tablas vacías; si `tenant_events` está particionada por mes, cada chunk va
+directo a su partición (sin tuple routing).
+
+    uv run python -m app.snapshot.cli export --out /backups/cp-2025-11-01 --jobs 8
+    uv run python -m app.snapshot.cli restore --from /backups/cp-2025-11-01 --jobs 8
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import psycopg
+from psycopg import sql
+from sqlalchemy.engine import make_url
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FORMAT = 1
+SCHEMA = "control_plane"
+# Orden de restore (FKs); event_types ya viene sembrado por migración => merge
+TABLES = ("event_types", "tenants", "tenant_limits", "tenant_events")
+MERGE_KEYS = {"event_types": "code"}
+CHUNKED_TABLE = "tenant_events"
+
+SNAPSHOT_JOBS = int(os.getenv("SNAPSHOT_JOBS", "4"))
+# gzip nivel 1: la compresión no debe ser el cuello de botella frente a COPY
+SNAPSHOT_COMPRESSLEVEL = int(os.getenv("SNAPSHOT_COMPRESSLEVEL", "1"))
+_BLOCK = 1 << 20
+
+_COLUMNS_SQL = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+    FROM pg_attribute a
+    WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+# Particiones por rango de created_at (FOR VALUES FROM ('...') TO ('...'))
+_PARTITIONS_SQL = """
+    SELECT i.inhrelid::regclass::text, m[1]::timestamptz, m[2]::timestamptz
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid,
+    LATERAL regexp_match(
+        pg_get_expr(c.relpartbound, c.oid), 'FROM \\(''([^'']+)''\\) TO \\(''([^'']+)''\\)'
+    ) AS m
+    WHERE i.inhparent = %s::regclass AND m IS NOT NULL
+"""
+
+
+def _dsn() -> str:
+    url = os.getenv("CONTROL_PLANE_DATABASE_URL")
+    if not url:
+        raise RuntimeError("CONTROL_PLANE_DATABASE_URL no está definida en el entorno")
+    # psycopg nativo no entiende el prefijo de dialecto de SQLAlchemy
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _connect(dsn: str, snapshot: bool = False) -> psycopg.Connection:
+    # UTC: los límites de mes de los chunks no dependen del TimeZone del servidor
+    conn = psycopg.connect(dsn, options="-c TimeZone=UTC")
+    if snapshot:
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        conn.read_only = True
+    return conn
+
+
+class _HashingWriter:
+    """sha256 de los bytes comprimidos mientras se escriben (se verifica en restore)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, b) -> int:
+        self.digest.update(b)
+        return self.f.write(b)
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+class _HashingReader:
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, n: int = -1) -> bytes:
+        b = self.f.read(n)
+        self.digest.update(b)
+        return b
+
+
+def _qualified(table: str) -> str:
+    return f"{SCHEMA}.{table}"
+
+
+def _alembic_revision(conn: psycopg.Connection) -> Optional[str]:
+    if conn.execute("SELECT to_regclass('alembic_version')").fetchone()[0] is None:
+        return None
+    row = conn.execute("SELECT version_num FROM alembic_version").fetchone()
+    return row[0] if row else None
+
+
+def _columns(conn: psycopg.Connection, table: str) -> List[Tuple[str, str]]:
+    return [(n, t) for n, t in conn.execute(_COLUMNS_SQL, (_qualified(table),)).fetchall()]
+
+
+def _month_ranges(lo: datetime, hi: datetime) -> List[Tuple[datetime, datetime]]:
+    out = []
+    start = lo.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while start <= hi:
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        out.append((start, end))
+        start = end
+    return out
+
+
+# ---- Export ----
+
+@dataclass
+class _Chunk:
+    table: str
+    file: str
+    lo: Optional[datetime] = None
+    hi: Optional[datetime] = None
+
+
+def _export_chunk(dsn: str, snapshot_id: str, out: Path, chunk: _Chunk, columns: List[str]) -> dict:
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    query = sql.SQL("SELECT {} FROM {}.{}").format(cols, sql.Identifier(SCHEMA), sql.Identifier(chunk.table))
+    params: Tuple = ()
+    if chunk.lo is not None:
+        query += sql.SQL(" WHERE created_at >= %s AND created_at < %s")
+        params = (chunk.lo, chunk.hi)
+    copy_sql = sql.SQL("COPY ({}) TO STDOUT (FORMAT binary)").format(query)
+
+    path = out / chunk.file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _connect(dsn, snapshot=True) as conn, conn.cursor() as cur, open(path, "wb") as raw:
+        # Debe ser la primera sentencia de la transacción
+        cur.execute(sql.SQL("SET TRANSACTION SNAPSHOT {}").format(sql.Literal(snapshot_id)))
+        out_f = _HashingWriter(raw)
+        with gzip.GzipFile(fileobj=out_f, mode="wb", compresslevel=SNAPSHOT_COMPRESSLEVEL, mtime=0) as gz:
+            with cur.copy(copy_sql, params or None) as copy:
+                for block in copy:
+                    gz.write(block)
+        rows = cur.rowcount
+        conn.rollback()
+
+    if rows == 0 and chunk.lo is not None:
+        path.unlink()
+        return {}
+    entry = {"file": chunk.file, "rows": rows, "bytes": path.stat().st_size, "sha256": out_f.digest.hexdigest()}
+    if chunk.lo is not None:
+        entry["range"] = [chunk.lo.isoformat(), chunk.hi.isoformat()]
+    return entry
+
+
+def export(out: Path, jobs: int) -> dict:
+    dsn = _dsn()
+    out.mkdir(parents=True, exist_ok=False)
+    t0 = time.perf_counter()
+
+    # Líder: mantiene abierta la transacción cuyo snapshot importan los workers
+    with _connect(dsn, snapshot=True) as leader:
+        snapshot_id = leader.execute("SELECT pg_export_snapshot()").fetchone()[0]
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "alembic_revision": _alembic_revision(leader),
+            "server_version": leader.info.server_version,
+            "compression": "gzip",
+            "copy_format": "binary",
+            "tables": {},
+        }
+        chunks: List[_Chunk] = []
+        for table in TABLES:
+            columns = _columns(leader, table)
+            manifest["tables"][table] = {"columns": [list(c) for c in columns], "chunks": []}
+            if table != CHUNKED_TABLE:
+                chunks.append(_Chunk(table, f"{table}.copy.gz"))
+                continue
+            lo, hi = leader.execute(
+                sql.SQL("SELECT min(created_at), max(created_at) FROM {}.{}").format(
+                    sql.Identifier(SCHEMA), sql.Identifier(table)
+                )
+            ).fetchone()
+            if lo is not None:
+                for a, b in _month_ranges(lo, hi):
+                    chunks.append(_Chunk(table, f"{table}/{a:%Y-%m}.copy.gz", a, b))
+
+        # Los chunks grandes (eventos) primero: mejor reparto entre workers
+        chunks.sort(key=lambda c: c.table != CHUNKED_TABLE)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                (c, pool.submit(
+                    _export_chunk, dsn, snapshot_id, out, c,
+                    [n for n, _ in manifest["tables"][c.table]["columns"]],
+                ))
+                for c in chunks
+            ]
+            for chunk, fut in futures:
+                entry = fut.result()
+                if entry:
+                    manifest["tables"][chunk.table]["chunks"].append(entry)
+        leader.rollback()
+
+    for table in manifest["tables"].values():
+        table["chunks"].sort(key=lambda e: e["file"])
+        table["rows"] = sum(e["rows"] for e in table["chunks"])
+    manifest["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+# ---- Restore ----
+
+def _event_partitions(conn: psycopg.Connection) -> List[Tuple[str, datetime, datetime]]:
+    return conn.execute(_PARTITIONS_SQL, (_qualified(CHUNKED_TABLE),)).fetchall()
+
+
+def _target_for(table: str, entry: dict, partitions: List[Tuple[str, datetime, datetime]]) -> sql.Composable:
+    if "range" in entry:
+        lo, hi = (datetime.fromisoformat(v) for v in entry["range"])
+        for name, p_lo, p_hi in partitions:
+            if p_lo <= lo and hi <= p_hi:
+                schema, _, rel = name.rpartition(".")
+                return sql.Identifier(schema or SCHEMA, rel)
+    return sql.Identifier(SCHEMA, table)
+
+
+def _restore_chunk(dsn: str, src: Path, table: str, entry: dict, columns: List[str], target: sql.Composable) -> int:
+    path = src / entry["file"]
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    merge_key = MERGE_KEYS.get(table)
+    with _connect(dsn) as conn, open(path, "rb") as raw:
+        in_f = _HashingReader(raw)
+        # Un restore fallido se re-ejecuta completo: no hace falta esperar el fsync de cada commit
+        conn.execute("SET synchronous_commit = off")
+        dest = target
+        if merge_key:
+            conn.execute(
+                sql.SQL("CREATE TEMP TABLE _snap (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(target)
+            )
+            dest = sql.Identifier("_snap")
+        with conn.cursor() as cur:
+            with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN (FORMAT binary)").format(dest, cols)) as copy:
+                with gzip.GzipFile(fileobj=in_f, mode="rb") as gz:
+                    while block := gz.read(_BLOCK):
+                        copy.write(block)
+            rows = cur.rowcount
+            if merge_key:
+                cur.execute(
+                    sql.SQL("INSERT INTO {} ({}) SELECT {} FROM _snap ON CONFLICT ({}) DO NOTHING").format(
+                        target, cols, cols, sql.Identifier(merge_key)
+                    )
+                )
+        if in_f.digest.hexdigest() != entry["sha256"]:
+            conn.rollback()
+            raise RuntimeError(f"{entry['file']}: sha256 no coincide con el manifest")
+        conn.commit()
+    return rows
+
+
+def restore(src: Path, jobs: int, force: bool = False) -> Dict[str, int]:
+    dsn = _dsn()
+    manifest = json.loads((src / "manifest.json").read_text())
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise RuntimeError(f"formato de manifest no soportado: {manifest.get('format')}")
+
+    with _connect(dsn) as conn:
+        revision = _alembic_revision(conn)
+        if revision != manifest["alembic_revision"] and not force:
+            raise RuntimeError(
+                f"revisión de esquema destino={revision} != snapshot={manifest['alembic_revision']} "
+                f"(migrar el destino o usar --force)"
+            )
+        for table, spec in manifest["tables"].items():
+            # COPY binary exige tipos idénticos; el destino puede tener columnas extra con default
+            target_cols = dict(_columns(conn, table))
+            for name, type_ in spec["columns"]:
+                if target_cols.get(name) != type_:
+                    raise RuntimeError(f"{table}.{name}: tipo destino={target_cols.get(name)} != snapshot={type_}")
+            if table not in MERGE_KEYS and conn.execute(
+                sql.SQL("SELECT EXISTS (SELECT 1 FROM {})").format(sql.Identifier(SCHEMA, table))
+            ).fetchone()[0]:
+                raise RuntimeError(f"{_qualified(table)} no está vacía; restore sólo sobre tablas nuevas")
+        partitions = _event_partitions(conn)
+        conn.rollback()
+    if partitions:
+        log.info("snapshot: %d particiones de %s detectadas", len(partitions), CHUNKED_TABLE)
+
+    restored: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        # Tablas padre en orden (FKs), luego los chunks de eventos en paralelo
+        for table in TABLES:
+            spec = manifest["tables"].get(table)
+            if not spec:
+                continue
+            columns = [n for n, _ in spec["columns"]]
+            futures = [
+                pool.submit(
+                    _restore_chunk, dsn, src, table, entry, columns, _target_for(table, entry, partitions)
+                )
+                for entry in spec["chunks"]
+            ]
+            restored[table] = sum(f.result() for f in futures)
+
+    with _connect(dsn) as conn:
+        conn.autocommit = True
+        for table in restored:
+            conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(SCHEMA, table)))
+    return restored
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Snapshot export/restore del control plane")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="COPY binary de las tablas a chunks gzip + manifest.json")
+    ex.add_argument("--out", type=Path, required=True, help="directorio destino (no debe existir)")
+    ex.add_argument("--jobs", type=int, default=SNAPSHOT_JOBS)
+    rs = sub.add_parser("restore", help="COPY en paralelo desde un snapshot a tablas vacías")
+    rs.add_argument("--from", dest="src", type=Path, required=True)
+    rs.add_argument("--jobs", type=int, default=SNAPSHOT_JOBS)
+    rs.add_argument("--force", action="store_true", help="ignora diferencia de revisión de Alembic")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    t0 = time.perf_counter()
+    if args.cmd == "export":
+        manifest = export(args.out, args.jobs)
+        counts = {t: spec["rows"] for t, spec in manifest["tables"].items()}
+    else:
+        counts = restore(args.src, args.jobs, args.force)
+    log.info("snapshot %s: %s en %.1fs", args.cmd, counts, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
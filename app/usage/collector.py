@@ -0,0 +1,162 @@
+"""
+Collector de uso por tenant (para hacer cumplir `tenant_limits`).
+
+Muestrea cada BD de tenant en paralelo (tamaño de BD, filas de usuarios, bytes de
+adjuntos) con un engine sin pool por tenant y hace UPSERT en
+`control_plane.tenant_usage_rollups` (buckets 'hour' y 'day'). Los endpoints de uso
+responden sólo desde los rollups; nunca tocan BDs de tenant en el request.
+
+    uv run python -m app.usage.collector            # loop cada USAGE_COLLECT_INTERVAL_S
+    uv run python -m app.usage.collector --once
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Mapping, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db import get_engine
+from app.deps.tenant_db import unpooled_tenant_engine
+from app.secrets.manager import SecretManager
+
+log = logging.getLogger(__name__)
+
+USAGE_COLLECT_INTERVAL_S = float(os.getenv("USAGE_COLLECT_INTERVAL_S", "900"))
+USAGE_COLLECT_CONCURRENCY = int(os.getenv("USAGE_COLLECT_CONCURRENCY", "10"))
+USAGE_SAMPLE_TIMEOUT_S = float(os.getenv("USAGE_SAMPLE_TIMEOUT_S", "30"))
+USAGE_HOURLY_RETENTION_DAYS = int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", "14"))
+USAGE_DAILY_RETENTION_DAYS = int(os.getenv("USAGE_DAILY_RETENTION_DAYS", "400"))
+# Tablas clave en la BD del tenant (esquema.tabla); si no existen, la métrica queda NULL
+USAGE_USERS_TABLE = os.getenv("USAGE_USERS_TABLE", "public.users")
+USAGE_ATTACHMENTS_TABLE = os.getenv("USAGE_ATTACHMENTS_TABLE", "public.attachments")
+
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+for _t in (USAGE_USERS_TABLE, USAGE_ATTACHMENTS_TABLE):
+    if not _IDENT_RE.match(_t):
+        raise RuntimeError(f"Nombre de tabla inválido para métricas de uso: {_t!r}")
+
+_SIZE_SQL = text("""
+    SELECT pg_database_size(current_database()) AS db_size_bytes,
+           to_regclass(:users_table) IS NOT NULL AS has_users,
+           pg_total_relation_size(to_regclass(:attachments_table)) AS attachments_bytes
+""")
+_USERS_SQL = text(f"SELECT count(*) FROM {USAGE_USERS_TABLE}")
+
+# Todo lo necesario para conectar: sin re-resolver cada slug contra el control plane
+_ACTIVE_TENANTS_SQL = text("""
+    SELECT t.id, t.slug, t.db_host, t.db_port, t.db_name, t.db_user, t.db_secret_ref,
+           t.billing_plan, l.statement_timeout_ms, l.idle_in_tx_timeout_ms
+    FROM control_plane.tenants t
+    LEFT JOIN control_plane.tenant_limits l ON l.tenant_id = t.id
+    WHERE t.deleted_at IS NULL AND t.status = 'active'
+""")
+
+_UPSERT_SQL = text("""
+    INSERT INTO control_plane.tenant_usage_rollups AS r
+      (tenant_id, granularity, bucket_start, samples,
+       db_size_bytes, users_count, attachments_bytes, last_sampled_at)
+    SELECT CAST(:tenant_id AS uuid), g, date_trunc(g, CAST(:sampled_at AS timestamptz), 'UTC'), 1,
+           CAST(:db_size_bytes AS bigint), CAST(:users_count AS bigint),
+           CAST(:attachments_bytes AS bigint), CAST(:sampled_at AS timestamptz)
+    FROM unnest(ARRAY['hour', 'day']) AS g
+    ON CONFLICT (tenant_id, granularity, bucket_start) DO UPDATE SET
+      samples = r.samples + 1,
+      db_size_bytes = GREATEST(r.db_size_bytes, EXCLUDED.db_size_bytes),
+      users_count = GREATEST(r.users_count, EXCLUDED.users_count),
+      attachments_bytes = GREATEST(r.attachments_bytes, EXCLUDED.attachments_bytes),
+      last_sampled_at = GREATEST(r.last_sampled_at, EXCLUDED.last_sampled_at)
+""")
+
+_PRUNE_SQL = text("""
+    DELETE FROM control_plane.tenant_usage_rollups
+    WHERE (granularity = 'hour' AND bucket_start < now() - make_interval(days => :hourly_days))
+       OR (granularity = 'day'  AND bucket_start < now() - make_interval(days => :daily_days))
+""")
+
+
+async def sample_tenant(engine: AsyncEngine) -> dict:
+    async with engine.connect() as conn:
+        row = (
+            await conn.execute(
+                _SIZE_SQL,
+                {"users_table": USAGE_USERS_TABLE, "attachments_table": USAGE_ATTACHMENTS_TABLE},
+            )
+        ).mappings().one()
+        users = (await conn.execute(_USERS_SQL)).scalar_one() if row["has_users"] else None
+    return {
+        "db_size_bytes": row["db_size_bytes"],
+        "users_count": users,
+        "attachments_bytes": row["attachments_bytes"],
+    }
+
+
+async def _sample_one(row: Mapping, sm: SecretManager, sem: asyncio.Semaphore) -> Optional[dict]:
+    async with sem:
+        engine = None
+        try:
+            # Sin pool: el collector corre cada USAGE_COLLECT_INTERVAL_S y no debe dejar
+            # una conexión ociosa abierta en cada BD de tenant entre ciclos
+            engine = await unpooled_tenant_engine(row, sm)
+            sample = await asyncio.wait_for(sample_tenant(engine), USAGE_SAMPLE_TIMEOUT_S)
+        except Exception:
+            log.exception("usage: fallo muestreando tenant %s", row["slug"])
+            return None
+        finally:
+            if engine is not None:
+                await engine.dispose()
+    sample["tenant_id"] = str(row["id"])
+    sample["sampled_at"] = datetime.now(timezone.utc)
+    return sample
+
+
+async def collect_once(concurrency: int = USAGE_COLLECT_CONCURRENCY) -> int:
+    cp_engine = get_engine()
+    async with cp_engine.connect() as conn:
+        tenants = (await conn.execute(_ACTIVE_TENANTS_SQL)).mappings().all()
+
+    sm = SecretManager()
+    sem = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_sample_one(t, sm, sem) for t in tenants))
+    samples: List[dict] = [r for r in results if r is not None]
+
+    async with cp_engine.begin() as conn:
+        if samples:
+            await conn.execute(_UPSERT_SQL, samples)
+        await conn.execute(
+            _PRUNE_SQL,
+            {"hourly_days": USAGE_HOURLY_RETENTION_DAYS, "daily_days": USAGE_DAILY_RETENTION_DAYS},
+        )
+    log.info("usage: %d/%d tenants muestreados", len(samples), len(tenants))
+    return len(samples)
+
+
+async def run_forever(interval_s: float, concurrency: int) -> None:
+    while True:
+        try:
+            await collect_once(concurrency)
+        except Exception:
+            log.exception("usage: ciclo de recolección fallido")
+        await asyncio.sleep(interval_s)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Collector de uso por tenant")
+    ap.add_argument("--once", action="store_true", help="un solo ciclo y salir")
+    ap.add_argument("--interval", type=float, default=USAGE_COLLECT_INTERVAL_S)
+    ap.add_argument("--concurrency", type=int, default=USAGE_COLLECT_CONCURRENCY)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.once:
+        asyncio.run(collect_once(args.concurrency))
+    else:
+        asyncio.run(run_forever(args.interval, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
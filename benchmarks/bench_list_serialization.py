@@ -0,0 +1,122 @@
+"""
+Benchmark: CPU por 10k filas al serializar listados (`list_tenants` / `list_events`).
+
+Compara el camino actual (instancias ORM -> validación `from_attributes` de FastAPI
+-> JSONResponse) contra el fast path (`?fast=true`: RowMapping -> orjson).
+Solo mide serialización; no necesita BD.
+
+    uv run python benchmarks/bench_list_serialization.py --rows 10000 --repeat 7
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from app.models.control_plane import Tenant, TenantEvent
+from app.responses import rows_response
+from app.schemas.control_plane import TenantEventOut, TenantOut
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def tenant_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "slug": f"tenant-{i}",
+            "display_name": f"Tenant {i}",
+            "db_name": f"tenant_{i}",
+            "db_host": "db-01.internal",
+            "db_port": 5432,
+            "db_user": f"tenant_{i}",
+            "db_secret_ref": f"tenants/tenant-{i}/db",
+            "schema_version": "0123456789ab",
+            "app_version": "1.4.2",
+            "status": "active",
+            "created_at": NOW,
+            "updated_at": NOW + timedelta(seconds=i),
+            "deleted_at": None,
+            "billing_plan": "standard",
+            "contact_email": f"ops+{i}@example.com",
+            "suspended_reason": None,
+            "maintenance_flag": False,
+        }
+        for i in range(n)
+    ]
+
+
+def event_rows(n: int) -> List[dict]:
+    tenant_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "tenant_id": tenant_id,
+            "event_type": "status_changed",
+            "actor": "system",
+            "payload": {"from": "provisioning", "to": "active", "seq": i},
+            "created_at": NOW + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+def current_path(model_cls, out_cls, rows: List[dict]) -> Callable[[], bytes]:
+    objs = [model_cls(**r) for r in rows]
+    field = create_model_field(name="Response", type_=List[out_cls], mode="serialization")
+
+    def run() -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=objs))
+        return JSONResponse(content).body
+
+    return run
+
+
+def fast_path(out_cls, rows: List[dict]) -> Callable[[], bytes]:
+    keys = list(out_cls.model_fields)
+    tuples = [tuple(r[k] for k in keys) for r in rows]
+
+    def run() -> bytes:
+        result = IteratorResult(SimpleResultMetaData(keys), iter(tuples))
+        return rows_response(result).body
+
+    return run
+
+
+def measure(fn: Callable[[], bytes], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        samples.append(time.process_time() - t0)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=7)
+    args = ap.parse_args()
+
+    per_10k = 10_000 / args.rows
+    cases = [
+        ("tenants", Tenant, TenantOut, tenant_rows(args.rows)),
+        ("events", TenantEvent, TenantEventOut, event_rows(args.rows)),
+    ]
+    print(f"rows={args.rows} repeat={args.repeat} (CPU ms por 10k filas, mediana)")
+    for name, model_cls, out_cls, rows in cases:
+        cur = measure(current_path(model_cls, out_cls, rows), args.repeat) * 1000 * per_10k
+        fast = measure(fast_path(out_cls, rows), args.repeat) * 1000 * per_10k
+        print(f"  {name:<8} actual={cur:8.1f} ms  fast={fast:8.1f} ms  speedup={cur / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
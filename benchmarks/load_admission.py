@@ -0,0 +1,110 @@
+"""
+Load test (simulado, sin BD): p99 de un tenant "bien portado" con un tenant caliente
+en paralelo, con y sin control de admisión (`app.deps.admission`).
+
+Cada request admitido toma una conexión del pool del tenant (15 = 5 + overflow 10),
+espera una "query" de QUERY_MS y gasta CPU_MS de CPU en el event loop
+(serialización). El tenant caliente llega en lazo abierto a --hot-rps.
+
+    uv run python benchmarks/load_admission.py --hot-rps 1000 --seconds 6
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import Depends, FastAPI, Header
+
+from app.deps.admission import AdmissionLimits, TenantAdmission
+
+POOL_SIZE = 15
+QUERY_MS = 10.0
+CPU_MS = 2.0
+
+
+def build_app(admission: Optional[TenantAdmission], limits: AdmissionLimits) -> FastAPI:
+    app = FastAPI()
+    pools: Dict[str, asyncio.Semaphore] = {}
+
+    async def tenant_dep(x_tenant_slug: str = Header()):
+        if admission is None:
+            yield x_tenant_slug
+            return
+        async with admission.admit(x_tenant_slug, limits):
+            yield x_tenant_slug
+
+    @app.get("/work")
+    async def work(slug: str = Depends(tenant_dep)):
+        pool = pools.setdefault(slug, asyncio.Semaphore(POOL_SIZE))
+        async with pool:
+            await asyncio.sleep(QUERY_MS / 1000)
+        end = time.perf_counter() + CPU_MS / 1000
+        while time.perf_counter() < end:
+            pass
+        return {"ok": True}
+
+    return app
+
+
+async def run(app: FastAPI, hot_rps: float, seconds: float) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t", timeout=60) as client:
+        hot_status: Counter = Counter()
+        good_lat: List[float] = []
+        stop = time.perf_counter() + seconds
+
+        async def hot_one():
+            r = await client.get("/work", headers={"x-tenant-slug": "hot"})
+            hot_status[r.status_code] += 1
+
+        async def hot_loop():
+            tasks = []
+            tick = 0.005
+            per_tick = hot_rps * tick
+            acc = 0.0
+            while time.perf_counter() < stop:
+                acc += per_tick
+                while acc >= 1:
+                    tasks.append(asyncio.create_task(hot_one()))
+                    acc -= 1
+                await asyncio.sleep(tick)
+            await asyncio.gather(*tasks)
+
+        async def good_loop():
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                r = await client.get("/work", headers={"x-tenant-slug": "good"})
+                assert r.status_code == 200, r.status_code
+                good_lat.append((time.perf_counter() - t0) * 1000)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(hot_loop(), good_loop())
+
+    q = statistics.quantiles(good_lat, n=100)
+    return {"good_p50": q[49], "good_p99": q[98], "good_n": len(good_lat), "hot": dict(hot_status)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hot-rps", type=float, default=1000)
+    ap.add_argument("--seconds", type=float, default=6)
+    ap.add_argument("--max-concurrent", type=int, default=12)
+    ap.add_argument("--rate", type=float, default=100)
+    ap.add_argument("--burst", type=int, default=50)
+    args = ap.parse_args()
+
+    limits = AdmissionLimits(max_concurrent=args.max_concurrent, rate_per_s=args.rate, burst=args.burst)
+    for name, admission in (("sin admisión", None), ("con admisión", TenantAdmission(queue_timeout_s=0.2))):
+        res = asyncio.run(run(build_app(admission, limits), args.hot_rps, args.seconds))
+        print(
+            f"{name:<13} good p50={res['good_p50']:7.1f} ms  p99={res['good_p99']:7.1f} ms "
+            f"(n={res['good_n']})  hot={res['hot']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.deps.admission import AdmissionLimits, TenantAdmission, _Slots
+
+
+async def _settle() -> None:
+    # Deja correr a las tasks ya despertadas
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_resize_down_keeps_in_flight_and_blocks_until_below_limit():
+    slots = _Slots(2)
+    await slots.acquire()
+    await slots.acquire()
+    slots.resize(1)
+    waiter = asyncio.create_task(slots.acquire())
+    await _settle()
+
+    slots.release()
+    await _settle()
+    # in_flight 1 con límite 1: sigue sin lugar
+    assert not waiter.done()
+
+    slots.release()
+    await _settle()
+    assert waiter.done()
+    assert slots.in_flight == 1
+
+
+async def test_resize_up_wakes_waiters_up_to_new_limit():
+    slots = _Slots(1)
+    await slots.acquire()
+    waiters = [asyncio.create_task(slots.acquire()) for _ in range(3)]
+    await _settle()
+
+    slots.resize(3)
+    await _settle()
+    assert [w.done() for w in waiters] == [True, True, False]
+    assert slots.in_flight == 3
+
+    slots.release()
+    await _settle()
+    assert waiters[2].done()
+    assert slots.in_flight == 3
+
+
+async def test_cancel_racing_wakeup_passes_turn_to_next_waiter():
+    slots = _Slots(1)
+    await slots.acquire()
+    first = asyncio.create_task(slots.acquire())
+    second = asyncio.create_task(slots.acquire())
+    await _settle()
+
+    # release() despierta a `first`, que se cancela antes de volver a correr (timeout)
+    slots.release()
+    first.cancel()
+    await _settle()
+
+    assert first.cancelled()
+    assert second.done()
+    assert slots.in_flight == 1
+    assert not slots._waiters
+
+
+async def test_timeout_racing_wakeup_through_admission():
+    admission = TenantAdmission(queue_timeout_s=0.05)
+    limits = AdmissionLimits(max_concurrent=1, rate_per_s=1000, burst=1000)
+    holder_in = asyncio.Event()
+    holder_out = asyncio.Event()
+
+    async def holder():
+        async with admission.admit("t1", limits):
+            holder_in.set()
+            await holder_out.wait()
+
+    async def waiter():
+        async with admission.admit("t1", limits):
+            return True
+
+    h = asyncio.create_task(holder())
+    await holder_in.wait()
+    w1 = asyncio.create_task(waiter())
+    w2 = asyncio.create_task(waiter())
+    await _settle()
+    holder_out.set()
+    results = await asyncio.gather(h, w1, w2, return_exceptions=True)
+
+    assert results[1:] == [True, True]
+    slots = admission._gates["t1"].slots
+    assert slots.in_flight == 0
+    assert not slots._waiters
+
+
+async def test_503_refunds_the_token():
+    admission = TenantAdmission(queue_timeout_s=0)
+    # Sin recarga práctica: sólo los 2 tokens del burst
+    limits = AdmissionLimits(max_concurrent=1, rate_per_s=0.001, burst=2)
+
+    async with admission.admit("t1", limits):
+        with pytest.raises(HTTPException) as exc:
+            async with admission.admit("t1", limits):
+                pass
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == "1"
+
+    # El token del 503 se devolvió: hay lugar para una más antes del 429
+    async with admission.admit("t1", limits):
+        pass
+    with pytest.raises(HTTPException) as exc:
+        async with admission.admit("t1", limits):
+            pass
+    assert exc.value.status_code == 429
+
+
+async def test_503_after_queue_timeout_refunds_the_token():
+    admission = TenantAdmission(queue_timeout_s=0.01)
+    limits = AdmissionLimits(max_concurrent=1, rate_per_s=0.001, burst=3)
+
+    async with admission.admit("t1", limits):
+        with pytest.raises(HTTPException) as exc:
+            async with admission.admit("t1", limits):
+                pass
+        assert exc.value.status_code == 503
+
+    bucket = admission._gates["t1"].bucket
+    assert bucket.tokens == pytest.approx(2, abs=0.01)
+    assert admission._gates["t1"].slots.in_flight == 0
+
+
+async def test_reconfigure_resizes_gate_in_place():
+    admission = TenantAdmission(queue_timeout_s=0)
+    small = AdmissionLimits(max_concurrent=1, rate_per_s=1000, burst=1000)
+    large = AdmissionLimits(max_concurrent=2, rate_per_s=1000, burst=1000)
+
+    async with admission.admit("t1", small):
+        gate = admission._gates["t1"]
+        async with admission.admit("t1", large):
+            assert admission._gates["t1"] is gate
+            assert gate.slots.in_flight == 2
+    assert gate.slots.in_flight == 0
@@ -0,0 +1,140 @@
+"""claim_batch contra una conexión falsa que emula tenant_jobs en memoria."""
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set
+
+from app.jobs import queue
+
+
+class _Result:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+
+    def mappings(self) -> "_Result":
+        return self
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalars(self):
+        return iter(next(iter(r.values())) for r in self.rows)
+
+
+class FakeQueueConn:
+    """
+    Jobs en orden de cola. `row_locks` emula filas tomadas por otra transacción
+    (SKIP LOCKED) y `advisory_locks` los locks de tenant/host de otro worker.
+    """
+
+    def __init__(self, jobs: List[Dict[str, Any]], row_locks: Optional[Set[str]] = None,
+                 advisory_locks: Optional[Set[str]] = None):
+        self.jobs = [{"status": "queued", **j} for j in jobs]
+        self.row_locks = row_locks or set()
+        self.advisory_locks = advisory_locks or set()
+        self.statements: List[Any] = []
+        self.committed = False
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+        self.committed = True
+
+    def _running(self, **match) -> List[Dict[str, Any]]:
+        return [j for j in self.jobs if j["status"] == "running" and all(j[k] == v for k, v in match.items())]
+
+    async def execute(self, stmt, params):
+        self.statements.append(stmt)
+        if stmt is queue._CANDIDATES_SQL:
+            rows = [
+                {"id": j["id"], "tenant_id": j["tenant_id"], "db_host": j["db_host"]}
+                for j in self.jobs
+                if j["status"] == "queued"
+                and j["id"] not in self.row_locks
+                and j["tenant_id"] not in params["skip_tenants"]
+                and j["db_host"] not in params["skip_hosts"]
+                and not self._running(tenant_id=j["tenant_id"])
+                and len(self._running(db_host=j["db_host"])) < params["per_host_cap"]
+            ]
+            return _Result(rows[: params["scan"]])
+        if stmt is queue._LOCK_TENANTS_SQL:
+            return _Result([{"t": t} for t in params["tenant_ids"] if t not in self.advisory_locks])
+        if stmt is queue._LOCK_HOSTS_SQL:
+            return _Result([{"h": h} for h in params["hosts"] if h not in self.advisory_locks])
+        if stmt is queue._BUSY_TENANTS_SQL:
+            return _Result([{"tenant_id": t} for t in params["tenant_ids"] if self._running(tenant_id=t)])
+        if stmt is queue._RUNNING_PER_HOST_SQL:
+            return _Result([
+                {"db_host": h, "n": len(self._running(db_host=h))}
+                for h in params["hosts"] if self._running(db_host=h)
+            ])
+        if stmt is queue._MARK_RUNNING_SQL:
+            rows = []
+            for j in self.jobs:
+                if j["id"] in params["ids"]:
+                    j.update(status="running", locked_by=params["worker_id"])
+                    rows.append({"id": j["id"], "tenant_id": j["tenant_id"], "db_host": j["db_host"]})
+            return _Result(rows)
+        raise AssertionError(f"sentencia inesperada: {stmt}")
+
+
+def _jobs(*specs: str) -> List[Dict[str, Any]]:
+    # "tenant@host" en orden de cola
+    return [
+        {"id": f"j{i}", "tenant_id": spec.split("@")[0], "db_host": spec.split("@")[1]}
+        for i, spec in enumerate(specs)
+    ]
+
+
+async def test_empty_queue_claims_nothing():
+    conn = FakeQueueConn([])
+    assert await queue.claim_batch(conn, "w1", limit=5, per_host_cap=2) == []
+    assert queue._MARK_RUNNING_SQL not in conn.statements
+
+
+async def test_one_job_per_tenant_per_batch():
+    conn = FakeQueueConn(_jobs("a@h1", "a@h1", "b@h1", "c@h2"))
+    claimed = await queue.claim_batch(conn, "w1", limit=5, per_host_cap=5)
+    assert [j["id"] for j in claimed] == ["j0", "j2", "j3"]
+    assert conn.committed
+
+
+async def test_busy_tenant_at_head_does_not_block_the_batch():
+    # La cabeza de la cola es de un tenant con muchos jobs: el lote sigue escaneando
+    conn = FakeQueueConn(_jobs(*["a@h1"] * 20, "b@h2", "c@h3"))
+    claimed = await queue.claim_batch(conn, "w1", limit=3, per_host_cap=5)
+    assert [j["tenant_id"] for j in claimed] == ["a", "b", "c"]
+
+
+async def test_tenant_with_running_job_is_skipped():
+    conn = FakeQueueConn(_jobs("a@h1", "a@h1", "b@h1"))
+    conn.jobs[0]["status"] = "running"
+    claimed = await queue.claim_batch(conn, "w1", limit=5, per_host_cap=5)
+    assert [j["id"] for j in claimed] == ["j2"]
+
+
+async def test_per_host_cap_counts_running_and_claimed():
+    conn = FakeQueueConn(_jobs("x@h1", "a@h1", "b@h1", "c@h1", "d@h2"))
+    conn.jobs[0]["status"] = "running"
+    claimed = await queue.claim_batch(conn, "w1", limit=5, per_host_cap=2)
+    assert [j["id"] for j in claimed] == ["j1", "j4"]
+
+
+async def test_locked_tenants_and_hosts_are_skipped():
+    # Tenant "a" y host "h2" en medio del claim de otro worker; j1 con la fila tomada
+    conn = FakeQueueConn(
+        _jobs("a@h1", "b@h1", "c@h2", "d@h3"),
+        row_locks={"j1"},
+        advisory_locks={"a", "h2"},
+    )
+    claimed = await queue.claim_batch(conn, "w1", limit=5, per_host_cap=5)
+    assert [j["id"] for j in claimed] == ["j3"]
+
+
+async def test_limit_is_respected():
+    conn = FakeQueueConn(_jobs("a@h1", "b@h1", "c@h2", "d@h2"))
+    claimed = await queue.claim_batch(conn, "w1", limit=2, per_host_cap=5)
+    assert len(claimed) == 2
+    assert sum(j["status"] == "running" for j in conn.jobs) == 2
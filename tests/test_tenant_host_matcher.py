@@ -0,0 +1,42 @@
+from app.deps.tenant_db import TenantHostMatcher, _parse_custom_domains
+
+
+def test_base_domain_subdomain_is_the_slug():
+    m = TenantHostMatcher(["example.com", ".tenants.io"], {})
+    assert m.match("acme.example.com") == "acme"
+    assert m.match("ACME.Example.com:8443") == "acme"
+    assert m.match("globex.tenants.io") == "globex"
+
+
+def test_base_domain_rejects_other_hosts():
+    m = TenantHostMatcher(["example.com"], {})
+    assert m.match("example.com") is None
+    assert m.match("a.b.example.com") is None
+    assert m.match("acme.example.com.evil.net") is None
+    assert m.match("acme.other.com") is None
+    assert m.match("-acme.example.com") is None
+    assert m.match("") is None
+
+
+def test_custom_domain_wins_over_base_domain():
+    m = TenantHostMatcher(["example.com"], {"App.Acme.com": "acme", "shop.example.com": "globex"})
+    assert m.match("app.acme.com") == "acme"
+    assert m.match("APP.ACME.COM:443") == "acme"
+    assert m.match("shop.example.com") == "globex"
+    assert m.match("www.acme.com") is None
+
+
+def test_without_base_domains_falls_back_to_first_label():
+    m = TenantHostMatcher([], {"app.acme.com": "acme"})
+    assert m.configured
+    assert m.match("app.acme.com") == "acme"
+    assert m.match("globex.localhost:8000") == "globex"
+    assert not TenantHostMatcher([], {}).configured
+
+
+def test_parse_custom_domains():
+    assert _parse_custom_domains(" app.acme.com = acme ,bad, shop.io=globex") == {
+        "app.acme.com": "acme",
+        "shop.io": "globex",
+    }
+    assert _parse_custom_domains("") == {}